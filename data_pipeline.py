@@ -3,11 +3,168 @@ Data Pipeline Module for DataForge AI
 Handles data profiling, transformation execution, and pipeline orchestration.
 """
 
+import os
 import sqlite3
 import json
+import threading
+from functools import lru_cache
+from statistics import fmean
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List, Optional
 
+# Upper bound on worker threads used to profile columns concurrently
+PROFILE_MAX_WORKERS = 8
+NUMERIC_TYPES = ("REAL", "INTEGER", "NUMERIC")
+# Above this many rows, non-TEXT distinct counts use a GROUP BY subquery
+DISTINCT_THRESHOLD = 50_000
+
+# Applied once to every cached connection when it is first opened
+CONNECTION_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "mmap_size=1073741824",  # 1 GiB: reads are served from the OS page cache via mmap
+    "cache_size=-262144",    # 256 MiB page cache
+)
+
+# Pipeline run history lives in its own database file (attached as `runs`) so
+# pipeline bookkeeping never waits on, or blocks, writers to the main database
+PIPELINE_RUNS_DDL = """
+    CREATE TABLE IF NOT EXISTS runs.pipeline_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pipeline_name TEXT NOT NULL,
+        status TEXT NOT NULL,
+        started_at TEXT,
+        completed_at TEXT,
+        records_processed INTEGER DEFAULT 0,
+        errors INTEGER DEFAULT 0,
+        stage TEXT DEFAULT 'idle'
+    )
+"""
+
+_local = threading.local()
+
+# Long-lived pool so worker threads keep their cached connections between calls
+_profile_executor = ThreadPoolExecutor(max_workers=PROFILE_MAX_WORKERS, thread_name_prefix="profiler")
+# Separate pool for whole tables: profile_table submits to _profile_executor
+# and would deadlock if it also ran on that pool
+_table_executor = ThreadPoolExecutor(max_workers=PROFILE_MAX_WORKERS, thread_name_prefix="profile-table")
+
+
+def runs_db_path(db_path: str) -> str:
+    """Path of the side database that holds pipeline_runs for db_path."""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}_runs{ext}"
+
+
+def attach_runs_db(conn: sqlite3.Connection, db_path: str):
+    """Attach the pipeline-runs database as `runs`, creating its table if needed.
+
+    Unqualified references to pipeline_runs resolve to runs.pipeline_runs, so
+    databases seeded before the split have their run history moved out of main
+    (where it would otherwise shadow the attached table).
+    """
+    c = conn.cursor()
+    c.execute("ATTACH DATABASE ? AS runs", (runs_db_path(db_path),))
+    c.execute("PRAGMA runs.journal_mode=WAL")
+    c.execute("PRAGMA runs.synchronous=NORMAL")
+    c.execute(PIPELINE_RUNS_DDL)
+    c.execute("SELECT 1 FROM main.sqlite_master WHERE type='table' AND name='pipeline_runs'")
+    if c.fetchone():
+        c.execute("INSERT OR IGNORE INTO runs.pipeline_runs SELECT * FROM main.pipeline_runs")
+        c.execute("DROP TABLE main.pipeline_runs")
+    conn.commit()
+
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """Return this thread's connection to db_path, opening and tuning it on first use.
+
+    Cached connections are shared by every caller on the thread, so callers must
+    not close them or change connection-level settings such as row_factory.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma}")
+        attach_runs_db(conn, db_path)
+        connections[db_path] = conn
+    return conn
+
+
+@lru_cache(maxsize=None)
+def _table_names(db_path: str) -> tuple:
+    c = get_connection(db_path).cursor()
+    # sqlite_stat* tables are planner statistics written by ANALYZE and mv_*
+    # tables are the dashboard's trigger-maintained summaries
+    c.execute(
+        "SELECT name FROM main.sqlite_master WHERE type='table' "
+        "AND name NOT LIKE 'sqlite_stat%' AND name NOT LIKE 'mv\\_%' ESCAPE '\\' "
+        "UNION SELECT name FROM runs.sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\' "
+        "ORDER BY name"
+    )
+    return tuple(row[0] for row in c.fetchall())
+
+
+@lru_cache(maxsize=None)
+def _table_columns(db_path: str, table_name: str) -> tuple:
+    c = get_connection(db_path).cursor()
+    c.row_factory = sqlite3.Row
+    c.execute(f"PRAGMA table_info({table_name})")
+    return tuple(c.fetchall())
+
+
+@lru_cache(maxsize=4096)
+def _profile_stats_sql(table_name: str, columns: tuple, large: bool) -> str:
+    """Build the single-scan stats query for a table.
+
+    columns is a tuple of (name, type, pk) triples and large selects the
+    GROUP BY distinct count for tables of DISTINCT_THRESHOLD rows or more.
+    The SQL only depends on these arguments, so it is generated once and the
+    identical text then also hits sqlite3's prepared-statement cache.
+    """
+    single_pk = sum(1 for _, _, pk in columns if pk) == 1
+    select_list = ["COUNT(*)"]
+    for col_name, col_type, pk in columns:
+        select_list.append(f"COUNT(*) - COUNT([{col_name}])")
+        if single_pk and pk and col_type == "INTEGER":
+            # Rowid alias: unique and never NULL, no DISTINCT needed
+            select_list.append("COUNT(*)")
+        elif not large or col_type == "TEXT":
+            select_list.append(f"COUNT(DISTINCT [{col_name}])")
+        else:
+            # Evaluated once as a GROUP BY, which SQLite can serve from an index
+            select_list.append(
+                f"(SELECT COUNT(*) FROM (SELECT [{col_name}] FROM {table_name} "
+                f"WHERE [{col_name}] IS NOT NULL GROUP BY [{col_name}]))"
+            )
+        if col_type in NUMERIC_TYPES:
+            select_list.append(f"MIN([{col_name}])")
+            select_list.append(f"MAX([{col_name}])")
+            select_list.append(f"ROUND(AVG([{col_name}]), 2)")
+            select_list.append(f"ROUND(SUM([{col_name}]), 2)")
+    return f"SELECT {', '.join(select_list)} FROM {table_name}"
+
+
+@lru_cache(maxsize=4096)
+def _sample_values_sql(table_name: str, col_name: str) -> str:
+    return f"SELECT DISTINCT [{col_name}] FROM {table_name} WHERE [{col_name}] IS NOT NULL LIMIT 5"
+
+
+@lru_cache(maxsize=64)
+def _count_rows_sql(table_names: tuple) -> str:
+    return "SELECT " + ", ".join(f"(SELECT COUNT(*) FROM [{t}])" for t in table_names)
+
+
+def clear_schema_cache():
+    """Drop cached table and column metadata; call after anything that changes the schema."""
+    _table_names.cache_clear()
+    _table_columns.cache_clear()
+
 
 class DataProfiler:
     """Generates statistical profiles of database tables."""
@@ -16,68 +173,50 @@ class DataProfiler:
         self.db_path = db_path
 
     def _connect(self):
-        return sqlite3.connect(self.db_path)
+        return get_connection(self.db_path)
 
     def profile_table(self, table_name: str) -> Dict:
         """Generate a comprehensive profile of a database table."""
+        columns_info = self.get_columns(table_name)
         conn = self._connect()
-        conn.row_factory = sqlite3.Row
         c = conn.cursor()
 
-        # Get columns info
-        c.execute(f"PRAGMA table_info({table_name})")
-        columns_info = c.fetchall()
-
-        # Get row count
+        # Get row count (answered from the b-tree, no column reads)
         c.execute(f"SELECT COUNT(*) FROM {table_name}")
         row_count = c.fetchone()[0]
 
+        # Every column's null/distinct/numeric stats in a single scan
+        columns = tuple((col_info["name"], col_info["type"], col_info["pk"]) for col_info in columns_info)
+        c.execute(_profile_stats_sql(table_name, columns, row_count >= DISTINCT_THRESHOLD))
+        stats = c.fetchone()
+
+        idx = 1
         profiles = []
         for col_info in columns_info:
-            col_name = col_info["name"]
             col_type = col_info["type"]
-            not_null = col_info["notnull"]
-
+            null_count = stats[idx]
             profile = {
-                "name": col_name,
+                "name": col_info["name"],
                 "type": col_type,
-                "not_null_constraint": bool(not_null),
+                "not_null_constraint": bool(col_info["notnull"]),
+                "null_count": null_count,
+                "null_pct": round((null_count / row_count * 100), 1) if row_count > 0 else 0,
+                "distinct_count": stats[idx + 1],
             }
-
-            # Null count
-            c.execute(f"SELECT COUNT(*) FROM {table_name} WHERE [{col_name}] IS NULL")
-            null_count = c.fetchone()[0]
-            profile["null_count"] = null_count
-            profile["null_pct"] = round((null_count / row_count * 100), 1) if row_count > 0 else 0
-
-            # Distinct count
-            c.execute(f"SELECT COUNT(DISTINCT [{col_name}]) FROM {table_name}")
-            profile["distinct_count"] = c.fetchone()[0]
-
-            # For numeric columns, get statistics
-            if col_type in ("REAL", "INTEGER", "NUMERIC"):
-                c.execute(f"""
-                    SELECT 
-                        MIN([{col_name}]) as min_val,
-                        MAX([{col_name}]) as max_val, 
-                        ROUND(AVG([{col_name}]), 2) as avg_val,
-                        ROUND(SUM([{col_name}]), 2) as sum_val
-                    FROM {table_name} WHERE [{col_name}] IS NOT NULL
-                """)
-                stats = c.fetchone()
-                profile["min"] = stats[0]
-                profile["max"] = stats[1]
-                profile["mean"] = stats[2]
-                profile["sum"] = stats[3]
-
-            # For text columns, get sample values
-            if col_type == "TEXT":
-                c.execute(f"SELECT DISTINCT [{col_name}] FROM {table_name} WHERE [{col_name}] IS NOT NULL LIMIT 5")
-                profile["sample_values"] = [row[0] for row in c.fetchall()]
-
+            idx += 2
+            if col_type in NUMERIC_TYPES:
+                profile["min"], profile["max"], profile["mean"], profile["sum"] = stats[idx:idx + 4]
+                idx += 4
             profiles.append(profile)
 
-        conn.close()
+        # Sample values still need a query per TEXT column; fan those out over a pool
+        text_profiles = [p for p in profiles if p["type"] == "TEXT"]
+        if text_profiles:
+            def _sample(profile):
+                return self._sample_values(table_name, profile["name"])
+
+            for profile, samples in zip(text_profiles, _profile_executor.map(_sample, text_profiles)):
+                profile["sample_values"] = samples
 
         return {
             "table": table_name,
@@ -88,27 +227,60 @@ class DataProfiler:
             "quality_score": self._calculate_quality_score(profiles, row_count),
         }
 
+    def count_rows(self, table_names: List[str]) -> Dict[str, int]:
+        """Exact row counts for several tables in a single statement."""
+        if not table_names:
+            return {}
+        c = self._connect().cursor()
+        c.execute(_count_rows_sql(tuple(table_names)))
+        return dict(zip(table_names, c.fetchone()))
+
+    def profile_tables(self, table_names: List[str]) -> Dict[str, Dict]:
+        """Profile several tables concurrently, each on its worker's own reader connection."""
+        return dict(zip(table_names, _table_executor.map(self.profile_table, table_names)))
+
+    def _sample_values(self, table_name: str, col_name: str) -> List:
+        """Fetch up to 5 distinct non-null values (safe to run in a worker thread)."""
+        c = get_connection(self.db_path).cursor()
+        c.execute(_sample_values_sql(table_name, col_name))
+        return [row[0] for row in c.fetchall()]
+
     def _calculate_quality_score(self, profiles: List[Dict], row_count: int) -> float:
         """Calculate an overall data quality score (0-100)."""
         if not profiles or row_count == 0:
             return 0.0
 
-        scores = []
-        for col in profiles:
-            # Completeness score
-            completeness = 100 - col.get("null_pct", 0)
-            scores.append(completeness)
-
-        return round(sum(scores) / len(scores), 1)
+        # Mean completeness across columns, reduced in one pass without an intermediate list
+        return round(fmean(100 - col.get("null_pct", 0) for col in profiles), 1)
 
     def get_all_tables(self) -> List[str]:
         """Get all table names from the database."""
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
-        tables = [row[0] for row in c.fetchall()]
-        conn.close()
-        return tables
+        return list(_table_names(self.db_path))
+
+    def get_columns(self, table_name: str) -> List[sqlite3.Row]:
+        """Get the PRAGMA table_info rows for a table."""
+        return list(_table_columns(self.db_path, table_name))
+
+
+# Pipeline statements are module constants so the connection's statement
+# cache reuses their prepared form across runs
+SQL_INSERT_RUN = "INSERT INTO pipeline_runs (pipeline_name, status, started_at, stage) VALUES (?, ?, ?, ?)"
+SQL_FINISH_RUN = """
+    UPDATE pipeline_runs 
+    SET status = ?, completed_at = ?, records_processed = ?, errors = ?, stage = ?
+    WHERE id = ?
+"""
+SQL_COUNT_ORDERS = "SELECT COUNT(*) FROM orders"
+SQL_COUNT_NULL_ORDERS = "SELECT COUNT(*) FROM orders WHERE total IS NULL OR order_date IS NULL"
+SQL_COUNT_NEGATIVE_TOTALS = "SELECT COUNT(*) FROM orders WHERE total < 0"
+SQL_COUNT_INCONSISTENT_TOTALS = """
+    SELECT COUNT(*) FROM orders 
+    WHERE total != ROUND(subtotal - discount + tax, 2)
+    AND subtotal IS NOT NULL AND discount IS NOT NULL AND tax IS NOT NULL
+"""
+SQL_COUNT_UNIQUE_EMAILS = "SELECT COUNT(DISTINCT email) FROM customers"
+SQL_COUNT_CUSTOMERS = "SELECT COUNT(*) FROM customers"
+SQL_COUNT_INVALID_RATINGS = "SELECT COUNT(*) FROM products WHERE rating < 1 OR rating > 5"
 
 
 class PipelineOrchestrator:
@@ -121,16 +293,15 @@ class PipelineOrchestrator:
         self.profiler = DataProfiler(db_path)
 
     def _connect(self):
-        return sqlite3.connect(self.db_path)
+        return get_connection(self.db_path)
 
     def get_pipeline_status(self) -> Dict:
         """Get the current status of all pipelines."""
         conn = self._connect()
-        conn.row_factory = sqlite3.Row
         c = conn.cursor()
         c.execute("SELECT * FROM pipeline_runs ORDER BY id DESC LIMIT 10")
-        runs = [dict(row) for row in c.fetchall()]
-        conn.close()
+        columns = [desc[0] for desc in c.description]
+        runs = [dict(zip(columns, row)) for row in c.fetchall()]
 
         return {
             "stages": self.STAGES,
@@ -150,28 +321,47 @@ class PipelineOrchestrator:
         conn = self._connect()
         c = conn.cursor()
 
+        # The run row and its final status are each written in their own short
+        # transaction; the stages in between only read, so concurrent runs
+        # never wait on each other for the runs database's write lock
         started = datetime.now().isoformat()
-        c.execute(
-            "INSERT INTO pipeline_runs (pipeline_name, status, started_at, stage) VALUES (?, ?, ?, ?)",
-            (pipeline_name, "running", started, "ingest")
-        )
+        c.execute(SQL_INSERT_RUN, (pipeline_name, "running", started, "ingest"))
         run_id = c.lastrowid
         conn.commit()
 
+        results, total_records, errors = self._run_stages(c)
+
+        completed = datetime.now().isoformat()
+        c.execute(SQL_FINISH_RUN, ("completed", completed, total_records, errors, "export", run_id))
+        conn.commit()
+
+        return {
+            "run_id": run_id,
+            "pipeline": pipeline_name,
+            "status": "completed",
+            "started_at": started,
+            "completed_at": completed,
+            "total_records": total_records,
+            "total_errors": errors,
+            "stages": results,
+        }
+
+    def _run_stages(self, c: sqlite3.Cursor):
+        """Run every stage; returns (stage results, total records, total errors)."""
         results = {}
         total_records = 0
         errors = 0
 
         # Stage 1: Ingest
-        c.execute("SELECT COUNT(*) FROM orders")
+        c.execute(SQL_COUNT_ORDERS)
         order_count = c.fetchone()[0]
         total_records += order_count
         results["ingest"] = {"records_loaded": order_count, "status": "completed"}
 
         # Stage 2: Validate
-        c.execute("SELECT COUNT(*) FROM orders WHERE total IS NULL OR order_date IS NULL")
+        c.execute(SQL_COUNT_NULL_ORDERS)
         null_orders = c.fetchone()[0]
-        c.execute("SELECT COUNT(*) FROM orders WHERE total < 0")
+        c.execute(SQL_COUNT_NEGATIVE_TOTALS)
         negative_totals = c.fetchone()[0]
         val_errors = null_orders + negative_totals
         errors += val_errors
@@ -183,12 +373,9 @@ class PipelineOrchestrator:
         }
 
         # Stage 3: Profile
-        tables = self.profiler.get_all_tables()
+        tables = [t for t in self.profiler.get_all_tables() if t not in ("datasets", "pipeline_runs")]
         profiles_summary = {}
-        for t in tables:
-            if t in ("datasets", "pipeline_runs"):
-                continue
-            profile = self.profiler.profile_table(t)
+        for t, profile in self.profiler.profile_tables(tables).items():
             profiles_summary[t] = {
                 "rows": profile["row_count"],
                 "columns": profile["column_count"],
@@ -197,11 +384,7 @@ class PipelineOrchestrator:
         results["profile"] = {"tables_profiled": len(profiles_summary), "summaries": profiles_summary, "status": "completed"}
 
         # Stage 4: Transform
-        c.execute("""
-            SELECT COUNT(*) FROM orders 
-            WHERE total != ROUND(subtotal - discount + tax, 2)
-            AND subtotal IS NOT NULL AND discount IS NOT NULL AND tax IS NOT NULL
-        """)
+        c.execute(SQL_COUNT_INCONSISTENT_TOTALS)
         inconsistent = c.fetchone()[0]
         results["transform"] = {
             "price_inconsistencies_found": inconsistent,
@@ -210,11 +393,11 @@ class PipelineOrchestrator:
         }
 
         # Stage 5: Quality Check
-        c.execute("SELECT COUNT(DISTINCT email) FROM customers")
+        c.execute(SQL_COUNT_UNIQUE_EMAILS)
         unique_emails = c.fetchone()[0]
-        c.execute("SELECT COUNT(*) FROM customers")
+        c.execute(SQL_COUNT_CUSTOMERS)
         total_customers = c.fetchone()[0]
-        c.execute("SELECT COUNT(*) FROM products WHERE rating < 1 OR rating > 5")
+        c.execute(SQL_COUNT_INVALID_RATINGS)
         invalid_ratings = c.fetchone()[0]
 
         quality_issues = (total_customers - unique_emails) + invalid_ratings
@@ -234,26 +417,31 @@ class PipelineOrchestrator:
             "status": "completed"
         }
 
-        # Finalize
-        completed = datetime.now().isoformat()
-        c.execute("""
-            UPDATE pipeline_runs 
-            SET status = ?, completed_at = ?, records_processed = ?, errors = ?, stage = ?
-            WHERE id = ?
-        """, ("completed", completed, total_records, errors, "export", run_id))
-        conn.commit()
-        conn.close()
+        return results, total_records, errors
 
-        return {
-            "run_id": run_id,
-            "pipeline": pipeline_name,
-            "status": "completed",
-            "started_at": started,
-            "completed_at": completed,
-            "total_records": total_records,
-            "total_errors": errors,
-            "stages": results,
-        }
+
+_READ_ONLY_ACTIONS = frozenset((
+    sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE,
+))
+# Schema-introspection pragmas usable as table-valued functions, e.g.
+# SELECT * FROM pragma_table_info('orders')
+_READ_ONLY_PRAGMAS = frozenset((
+    "table_info", "table_xinfo", "table_list", "index_list", "index_info", "index_xinfo",
+    "foreign_key_list", "database_list", "collation_list", "function_list", "module_list",
+    "pragma_list", "compile_options",
+))
+
+
+def _read_only_authorizer(action, arg1, arg2, db_name, trigger_name):
+    if action in _READ_ONLY_ACTIONS:
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_PRAGMA and arg1 in _READ_ONLY_PRAGMAS:
+        return sqlite3.SQLITE_OK
+    # Preparing a pragma table-valued function reports an update of
+    # sqlite_master; query_only still blocks any real write
+    if action == sqlite3.SQLITE_UPDATE and arg1 == "sqlite_master":
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
 
 
 class QueryExecutor:
@@ -265,19 +453,22 @@ class QueryExecutor:
     def execute(self, sql: str, limit: int = 100) -> Dict:
         """Execute a read-only SQL query and return results."""
         conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn.execute("ATTACH DATABASE ? AS runs", (runs_db_path(self.db_path),))
+        # Enforce read-only at the engine level too, which also catches
+        # statements smuggled past the prefix check (ATTACH, writes in CTEs, ...)
+        conn.execute("PRAGMA query_only=ON")
+        conn.set_authorizer(_read_only_authorizer)
         c = conn.cursor()
 
         try:
             # Basic safety: only allow SELECT
-            sql_stripped = sql.strip().upper()
-            if not sql_stripped.startswith("SELECT"):
+            if sql.lstrip()[:6].upper() != "SELECT":
                 return {"error": "Only SELECT queries are allowed", "rows": [], "columns": []}
 
             c.execute(sql)
             rows = c.fetchmany(limit)
             columns = [desc[0] for desc in c.description] if c.description else []
-            data = [dict(row) for row in rows]
+            data = [dict(zip(columns, row)) for row in rows]
 
             return {
                 "columns": columns,
@@ -4,19 +4,20 @@ FastAPI Backend with Prompt Engineering Integration
 """
 
 import os
-import sqlite3
+import csv
 import json
+import anyio
 from datetime import datetime
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
 
-from sample_data import seed_data
+from sample_data import seed_data, create_indexes, create_summary_tables
 from prompt_engine import engine as prompt_engine
-from data_pipeline import DataProfiler, PipelineOrchestrator, QueryExecutor
+from data_pipeline import DataProfiler, PipelineOrchestrator, QueryExecutor, get_connection, clear_schema_cache
 
 # =============================================================================
 # App Configuration
@@ -24,11 +25,15 @@ from data_pipeline import DataProfiler, PipelineOrchestrator, QueryExecutor
 
 DB_PATH = "dataforge.db"
 STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+UPLOAD_MAX_HEADER = 64 << 10  # 64 KiB; longer header lines are rejected
+THREADPOOL_SIZE = 64
 
 app = FastAPI(
     title="DataForge AI",
     description="E-Commerce Data Engineering Platform with Prompt Engineering",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -62,12 +67,24 @@ class SQLExecuteRequest(BaseModel):
 @app.on_event("startup")
 async def startup():
     """Seed sample data if database doesn't exist."""
+    # Endpoints that touch SQLite are plain `def`, so FastAPI runs them in
+    # this thread pool instead of blocking the event loop
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
     if not os.path.exists(DB_PATH):
         seed_data(DB_PATH)
         print("✅ Database seeded with sample e-commerce data")
     else:
         print("📦 Existing database found")
 
+    # Open the cached connection now; it also switches the database to WAL so
+    # the profiler's worker connections can read concurrently
+    conn = get_connection(DB_PATH)
+    create_indexes(conn)
+    create_summary_tables(conn)
+    prompt_engine.ensure_views(conn)
+    prompt_engine.ensure_indexes(conn)
+
 
 # =============================================================================
 # Root & Health
@@ -88,19 +105,21 @@ async def health():
 # =============================================================================
 
 @app.get("/api/datasets")
-async def list_datasets():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+def list_datasets():
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     c.execute("SELECT * FROM datasets ORDER BY id DESC")
-    datasets = [dict(row) for row in c.fetchall()]
-    conn.close()
+    columns = [desc[0] for desc in c.description]
+    datasets = [dict(zip(columns, row)) for row in c.fetchall()]
     return {"datasets": datasets}
 
 
 @app.post("/api/datasets/seed")
-async def seed_database():
+def seed_database():
     result = seed_data(DB_PATH)
+    clear_schema_cache()
+    # Reseeding drops the tables along with the template indexes
+    prompt_engine.ensure_indexes(get_connection(DB_PATH))
     return result
 
 
@@ -109,20 +128,45 @@ async def upload_csv(file: UploadFile = File(...)):
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only CSV files are supported")
 
-    content = await file.read()
-    lines = content.decode("utf-8").strip().split("\n")
-    row_count = len(lines) - 1  # Exclude header
-    col_count = len(lines[0].split(","))
+    # Stream the file: only the header line and a newline count are needed
+    header = b""
+    header_done = False
+    row_count = 0  # line breaks between the first and last non-blank content
+    trailing = 0   # line breaks in the current run of trailing whitespace
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        if not header:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+        if not header_done:
+            # The header ends at the first line break, \n, \r\n or a bare \r
+            ends = [i for i in (chunk.find(b"\n"), chunk.find(b"\r")) if i != -1]
+            end = min(ends) if ends else -1
+            header += chunk if end == -1 else chunk[:end]
+            header_done = end != -1
+            if len(header) > UPLOAD_MAX_HEADER:
+                raise HTTPException(status_code=400, detail="CSV header line is too long")
+        body = chunk.rstrip()
+        if body:
+            row_count += trailing + body.count(b"\n")
+            trailing = chunk.count(b"\n", len(body))
+        else:
+            trailing += chunk.count(b"\n")
+    # csv handles quoted commas in column names
+    try:
+        col_count = len(next(csv.reader([header.decode("utf-8")]), [""]))
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid CSV header: {e}")
 
     # Record the upload
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
     c.execute(
         "INSERT INTO datasets (name, source, row_count, column_count, created_at, status) VALUES (?, ?, ?, ?, ?, ?)",
         (file.filename, "upload", row_count, col_count, datetime.now().isoformat(), "active")
     )
     conn.commit()
-    conn.close()
+    clear_schema_cache()
 
     return {
         "message": f"Uploaded {file.filename}",
@@ -136,21 +180,19 @@ async def upload_csv(file: UploadFile = File(...)):
 # =============================================================================
 
 @app.get("/api/datasets/{dataset_id}/profile")
-async def get_profile(dataset_id: int):
+def get_profile(dataset_id: int):
     profiler = DataProfiler(DB_PATH)
     tables = profiler.get_all_tables()
     # Exclude meta tables
     data_tables = [t for t in tables if t not in ("datasets", "pipeline_runs")]
 
-    profiles = {}
-    for table in data_tables:
-        profiles[table] = profiler.profile_table(table)
+    profiles = profiler.profile_tables(data_tables)
 
     return {"dataset_id": dataset_id, "profiles": profiles}
 
 
 @app.get("/api/profile/{table_name}")
-async def profile_table(table_name: str):
+def profile_table(table_name: str):
     profiler = DataProfiler(DB_PATH)
     valid_tables = profiler.get_all_tables()
     if table_name not in valid_tables:
@@ -163,7 +205,7 @@ async def profile_table(table_name: str):
 # =============================================================================
 
 @app.post("/api/prompt/sql")
-async def prompt_to_sql(request: PromptRequest):
+def prompt_to_sql(request: PromptRequest):
     result = prompt_engine.generate_sql(request.prompt)
 
     # Execute the generated SQL
@@ -196,7 +238,7 @@ async def prompt_to_quality(request: PromptRequest):
 
 
 @app.post("/api/query/execute")
-async def execute_query(request: SQLExecuteRequest):
+def execute_query(request: SQLExecuteRequest):
     executor = QueryExecutor(DB_PATH)
     return executor.execute(request.sql)
 
@@ -206,13 +248,13 @@ async def execute_query(request: SQLExecuteRequest):
 # =============================================================================
 
 @app.get("/api/pipeline/status")
-async def pipeline_status():
+def pipeline_status():
     orchestrator = PipelineOrchestrator(DB_PATH)
     return orchestrator.get_pipeline_status()
 
 
 @app.post("/api/pipeline/run")
-async def run_pipeline():
+def run_pipeline():
     orchestrator = PipelineOrchestrator(DB_PATH)
     return orchestrator.run_pipeline()
 
@@ -221,98 +263,94 @@ async def run_pipeline():
 # Dashboard KPI Endpoints
 # =============================================================================
 
+# Every dashboard KPI in one statement. Revenue figures come from the
+# trigger-maintained mv_* summary tables (see sample_data.SUMMARY_TABLES), so
+# nothing here aggregates over orders or order_items; each result set is
+# tagged by kind. Groups whose orders were all removed keep a zero-count row;
+# the summaries store NULL keys as '', which NULLIF turns back into NULL.
+DASHBOARD_KPI_SQL = """
+    SELECT 'totals', NULL, ROUND(SUM(revenue), 2), COALESCE(SUM(orders), 0), ROUND(SUM(revenue) / SUM(orders_with_total), 2)
+    FROM mv_revenue_by_region
+    UNION ALL
+    SELECT 'customers', NULL, NULL, COUNT(*), NULL FROM customers
+    UNION ALL
+    SELECT 'products', NULL, NULL, COUNT(*), NULL FROM products
+    UNION ALL
+    SELECT 'category', c.name, ROUND(SUM(m.revenue), 2), NULL, NULL
+    FROM mv_revenue_by_product m
+    JOIN products p ON p.id = m.product_id
+    JOIN categories c ON c.id = p.category_id
+    WHERE m.items > 0
+    GROUP BY c.name
+    UNION ALL
+    SELECT 'region', NULLIF(region, ''), ROUND(revenue, 2), orders, NULL FROM mv_revenue_by_region WHERE orders > 0
+    UNION ALL
+    SELECT 'month', NULLIF(month, ''), ROUND(revenue, 2), orders, NULL FROM mv_monthly_trend WHERE orders > 0
+    UNION ALL
+    SELECT 'status', status, NULL, orders, NULL FROM mv_order_status WHERE orders > 0
+    UNION ALL
+    SELECT * FROM (
+        SELECT 'top_product', p.name, ROUND(m.revenue, 2) AS revenue, NULL, NULL
+        FROM mv_revenue_by_product m
+        JOIN products p ON p.id = m.product_id
+        WHERE m.items > 0
+        ORDER BY revenue DESC
+        LIMIT 5
+    )
+    UNION ALL
+    SELECT 'payment', NULLIF(payment_method, ''), ROUND(revenue, 2), orders, NULL FROM mv_payment_methods WHERE orders > 0
+"""
+
+
 @app.get("/api/dashboard/kpis")
-async def dashboard_kpis():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+def dashboard_kpis():
+    conn = get_connection(DB_PATH)
     c = conn.cursor()
 
-    kpis = {}
-
-    # Total Revenue
-    c.execute("SELECT ROUND(SUM(total), 2) FROM orders WHERE status != 'Cancelled'")
-    kpis["total_revenue"] = c.fetchone()[0] or 0
-
-    # Total Orders
-    c.execute("SELECT COUNT(*) FROM orders WHERE status != 'Cancelled'")
-    kpis["total_orders"] = c.fetchone()[0]
-
-    # Total Customers
-    c.execute("SELECT COUNT(*) FROM customers")
-    kpis["total_customers"] = c.fetchone()[0]
-
-    # Average Order Value
-    c.execute("SELECT ROUND(AVG(total), 2) FROM orders WHERE status != 'Cancelled'")
-    kpis["avg_order_value"] = c.fetchone()[0] or 0
-
-    # Total Products
-    c.execute("SELECT COUNT(*) FROM products")
-    kpis["total_products"] = c.fetchone()[0]
-
-    # Revenue by Category
-    c.execute("""
-        SELECT c.name, ROUND(SUM(oi.line_total), 2) AS revenue
-        FROM categories c
-        JOIN products p ON p.category_id = c.id
-        JOIN order_items oi ON oi.product_id = p.id
-        JOIN orders o ON o.id = oi.order_id
-        WHERE o.status != 'Cancelled'
-        GROUP BY c.name
-        ORDER BY revenue DESC
-    """)
-    kpis["revenue_by_category"] = [{"name": row[0], "revenue": row[1]} for row in c.fetchall()]
-
-    # Revenue by Region
-    c.execute("""
-        SELECT region, ROUND(SUM(total), 2) AS revenue, COUNT(*) AS orders
-        FROM orders
-        WHERE status != 'Cancelled'
-        GROUP BY region
-        ORDER BY revenue DESC
-    """)
-    kpis["revenue_by_region"] = [{"name": row[0], "revenue": row[1], "orders": row[2]} for row in c.fetchall()]
-
-    # Monthly Trend
-    c.execute("""
-        SELECT strftime('%Y-%m', order_date) AS month,
-               ROUND(SUM(total), 2) AS revenue,
-               COUNT(*) AS orders
-        FROM orders
-        WHERE status != 'Cancelled'
-        GROUP BY month
-        ORDER BY month
-    """)
-    kpis["monthly_trend"] = [{"month": row[0], "revenue": row[1], "orders": row[2]} for row in c.fetchall()]
-
-    # Order Status Breakdown
-    c.execute("""
-        SELECT status, COUNT(*) AS count
-        FROM orders GROUP BY status ORDER BY count DESC
-    """)
-    kpis["order_status"] = [{"status": row[0], "count": row[1]} for row in c.fetchall()]
-
-    # Top 5 Products
-    c.execute("""
-        SELECT p.name, ROUND(SUM(oi.line_total), 2) AS revenue
-        FROM products p
-        JOIN order_items oi ON oi.product_id = p.id
-        JOIN orders o ON o.id = oi.order_id
-        WHERE o.status != 'Cancelled'
-        GROUP BY p.id
-        ORDER BY revenue DESC
-        LIMIT 5
-    """)
-    kpis["top_products"] = [{"name": row[0], "revenue": row[1]} for row in c.fetchall()]
-
-    # Payment Methods
-    c.execute("""
-        SELECT payment_method, COUNT(*) as count, ROUND(SUM(total), 2) as total
-        FROM orders WHERE status != 'Cancelled'
-        GROUP BY payment_method ORDER BY count DESC
-    """)
-    kpis["payment_methods"] = [{"method": row[0], "count": row[1], "total": row[2]} for row in c.fetchall()]
-
-    conn.close()
+    kpis = {
+        "total_revenue": 0,
+        "total_orders": 0,
+        "total_customers": 0,
+        "avg_order_value": 0,
+        "total_products": 0,
+        "revenue_by_category": [],
+        "revenue_by_region": [],
+        "monthly_trend": [],
+        "order_status": [],
+        "top_products": [],
+        "payment_methods": [],
+    }
+
+    c.execute(DASHBOARD_KPI_SQL)
+    for kind, name, revenue, count, avg in c.fetchall():
+        if kind == "totals":
+            kpis["total_revenue"] = revenue or 0
+            kpis["total_orders"] = count
+            kpis["avg_order_value"] = avg or 0
+        elif kind == "customers":
+            kpis["total_customers"] = count
+        elif kind == "products":
+            kpis["total_products"] = count
+        elif kind == "category":
+            kpis["revenue_by_category"].append({"name": name, "revenue": revenue})
+        elif kind == "region":
+            kpis["revenue_by_region"].append({"name": name, "revenue": revenue, "orders": count})
+        elif kind == "month":
+            kpis["monthly_trend"].append({"month": name, "revenue": revenue, "orders": count})
+        elif kind == "status":
+            kpis["order_status"].append({"status": name, "count": count})
+        elif kind == "top_product":
+            kpis["top_products"].append({"name": name, "revenue": revenue})
+        elif kind == "payment":
+            kpis["payment_methods"].append({"method": name, "count": count, "total": revenue})
+
+    # A compound SELECT only orders the combined output, so sort each list here
+    kpis["revenue_by_category"].sort(key=lambda row: row["revenue"], reverse=True)
+    kpis["revenue_by_region"].sort(key=lambda row: row["revenue"], reverse=True)
+    kpis["monthly_trend"].sort(key=lambda row: row["month"] or "")
+    kpis["order_status"].sort(key=lambda row: row["count"], reverse=True)
+    kpis["payment_methods"].sort(key=lambda row: row["count"], reverse=True)
+
     return kpis
 
 
@@ -321,17 +359,10 @@ async def dashboard_kpis():
 # =============================================================================
 
 @app.get("/api/tables")
-async def list_tables():
+def list_tables():
     profiler = DataProfiler(DB_PATH)
     tables = profiler.get_all_tables()
-    result = []
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    for t in tables:
-        c.execute(f"SELECT COUNT(*) FROM {t}")
-        count = c.fetchone()[0]
-        c.execute(f"PRAGMA table_info({t})")
-        cols = len(c.fetchall())
-        result.append({"name": t, "rows": count, "columns": cols})
-    conn.close()
+    # One COUNT statement for every table; column counts come from the schema cache
+    counts = profiler.count_rows(tables)
+    result = [{"name": t, "rows": counts[t], "columns": len(profiler.get_columns(t))} for t in tables]
     return {"tables": result}
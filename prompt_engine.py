@@ -9,7 +9,10 @@ Demonstrates key prompt engineering techniques:
 """
 
 import re
+import sys
 import json
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Dict, List, Optional
 
 
@@ -27,6 +30,18 @@ TABLES:
 - orders (id, customer_id, order_date, status, payment_method, subtotal, discount, tax, total, region)
 - order_items (id, order_id, product_id, quantity, unit_price, line_total)
 
+VIEWS:
+- active_orders (orders excluding status 'Cancelled')
+
+SUMMARY TABLES (kept current by triggers; prefer them for aggregate questions):
+- mv_revenue_by_region (region, revenue, orders, orders_with_total)
+- mv_monthly_trend (month, revenue, orders, orders_with_total)  -- month is 'YYYY-MM'
+- mv_payment_methods (payment_method, revenue, orders, orders_with_total)
+- mv_order_status (status, orders)  -- all orders, including 'Cancelled'
+- mv_revenue_by_product (product_id, revenue, items)
+Revenue and item counts cover non-cancelled orders only. A missing key is stored as '' (product_id 0).
+Average order value is revenue / orders_with_total.
+
 RULES:
 1. Always use proper JOIN syntax
 2. Use aliases for readability
@@ -106,6 +121,18 @@ ORDER BY total_revenue DESC"""
     },
 ]
 
+# Each example's distinct lowercase input words, split once at import
+_FEWSHOT = tuple((tuple(dict.fromkeys(ex["input"].lower().split())), ex) for ex in SQL_FEW_SHOT_EXAMPLES)
+
+
+def _match_few_shot(prompt_lower: str) -> Optional[Dict]:
+    """Return the first example sharing an input word (as a substring) with the prompt."""
+    for words, ex in _FEWSHOT:
+        for word in words:
+            if word in prompt_lower:
+                return ex
+    return None
+
 # Intent patterns for query classification
 INTENT_PATTERNS = {
     "revenue": r"(?i)(revenue|sales|income|earning|money|amount)",
@@ -137,10 +164,120 @@ ENTITY_PATTERNS = {
 }
 
 
+def _freeze(value):
+    """Recursively turn dicts into read-only mappings and lists into tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _compile_alternation(patterns: Dict[str, str]) -> "re.Pattern":
+    """Combine patterns into one regex with a zero-width named group per key.
+
+    Lookaheads don't consume input, so scanning with finditer visits every
+    position where any pattern starts; m.lastgroup names the first key (in dict
+    order) that matches there. Inline (?i) flags are hoisted to IGNORECASE since
+    Python only allows global flags at the start of an expression.
+    """
+    return re.compile(
+        "|".join(f"(?=(?P<{key}>{pattern.replace('(?i)', '')}))" for key, pattern in patterns.items()),
+        re.IGNORECASE,
+    )
+
+
+def _literal_alternatives(pattern: str) -> Optional[List[str]]:
+    """Return the words of a plain "(?i)(a|b|c)" pattern, or None if it uses other regex syntax."""
+    m = re.fullmatch(r"\(\?i\)\(([a-z ]+(?:\|[a-z ]+)*)\)", pattern)
+    return m.group(1).split("|") if m else None
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """Build a regex matching any of words, factored into a prefix trie.
+
+    At each position the engine branches on one character at a time instead of
+    trying every word in turn; optional suffixes are greedy, so the longest word
+    that matches there wins.
+    """
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        if "" not in node:
+            return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return "(?:" + "|".join(alts) + ")?"
+
+    return emit(trie)
+
+
+def _compile_intent_keywords(patterns: Dict[str, str]):
+    """Build a keyword automaton over every literal intent pattern.
+
+    A hit on keyword k at some position means every keyword that is a prefix of
+    k matches there too, so each keyword maps to the intents of k and of its
+    prefixes. One finditer pass then labels every literal intent.
+    """
+    intents_by_keyword: Dict[str, List[str]] = {}
+    for intent, pattern in patterns.items():
+        for kw in _literal_alternatives(pattern) or ():
+            intents_by_keyword.setdefault(kw, []).append(intent)
+    regex = re.compile(f"(?=({_trie_pattern(list(intents_by_keyword))}))", re.IGNORECASE)
+    implied = {
+        kw: frozenset(intent for k in intents_by_keyword if kw.startswith(k) for intent in intents_by_keyword[k])
+        for kw in intents_by_keyword
+    }
+    return regex, implied
+
+
+def _keyword_intents(text: str) -> frozenset:
+    """Intents implied by a keyword hit, given the text the keyword regex matched."""
+    implied = INTENT_KEYWORD_IMPLIED.get(text.lower())
+    if implied is None:
+        # IGNORECASE also folds a few non-ASCII letters (e.g. the Kelvin sign)
+        # that str.lower() leaves alone
+        implied = next(v for k, v in INTENT_KEYWORD_IMPLIED.items()
+                       if re.fullmatch(re.escape(k), text, re.IGNORECASE))
+    return implied
+
+
+# Single-scan matchers over all intents / entities, built once at import.
+# Intents whose patterns aren't plain word lists are matched by their own regex.
+INTENT_KEYWORD_RE, INTENT_KEYWORD_IMPLIED = _compile_intent_keywords(INTENT_PATTERNS)
+INTENT_REGEX_ONLY = tuple(k for k, p in INTENT_PATTERNS.items() if _literal_alternatives(p) is None)
+ENTITY_RE = _compile_alternation(ENTITY_PATTERNS)
+
+
 # =============================================================================
 # SQL QUERY TEMPLATES — Structured outputs mapped to intents
 # =============================================================================
 
+# Views the templates read from; created by PromptEngine.ensure_views().
+# revenue_trend reads the trigger-maintained mv_monthly_trend summary instead.
+SQL_VIEWS = {
+    "active_orders": "CREATE VIEW IF NOT EXISTS active_orders AS SELECT * FROM orders WHERE status != 'Cancelled'",
+}
+
+# Covering indexes for the templates' joins and GROUP BYs; created by
+# PromptEngine.ensure_indexes()
+SQL_INDEXES = {
+    # top_products_revenue / profit_analysis: per-product line totals
+    "idx_orderitems_product": "CREATE INDEX IF NOT EXISTS idx_orderitems_product ON order_items(product_id, order_id, quantity, line_total)",
+    # revenue_by_region: grouped in index order, incl. distinct customers
+    "idx_orders_region": "CREATE INDEX IF NOT EXISTS idx_orders_region ON orders(region, status, total, customer_id)",
+    # payment_analysis
+    "idx_orders_payment": "CREATE INDEX IF NOT EXISTS idx_orders_payment ON orders(payment_method, status, total)",
+    # refund_analysis: month expression index, so the GROUP BY streams in index order
+    "idx_orders_month": "CREATE INDEX IF NOT EXISTS idx_orders_month ON orders(substr(order_date, 1, 7), status)",
+}
+
 SQL_TEMPLATES = {
     "revenue_by_category": """SELECT c.name AS category, 
        ROUND(SUM(oi.line_total), 2) AS total_revenue,
@@ -148,29 +285,26 @@ SQL_TEMPLATES = {
 FROM categories c
 JOIN products p ON p.category_id = c.id
 JOIN order_items oi ON oi.product_id = p.id
-JOIN orders o ON o.id = oi.order_id
-WHERE o.status != 'Cancelled'
+JOIN active_orders o ON o.id = oi.order_id
 GROUP BY c.name
 ORDER BY total_revenue DESC""",
 
     "revenue_by_region": """SELECT o.region,
        ROUND(SUM(o.total), 2) AS total_revenue,
-       COUNT(o.id) AS total_orders,
+       COUNT(*) AS total_orders,
        COUNT(DISTINCT o.customer_id) AS unique_customers,
        ROUND(AVG(o.total), 2) AS avg_order_value
-FROM orders o
-WHERE o.status != 'Cancelled'
+FROM active_orders o
 GROUP BY o.region
 ORDER BY total_revenue DESC""",
 
-    "revenue_trend": """SELECT strftime('%Y-%m', o.order_date) AS month,
-       ROUND(SUM(o.total), 2) AS revenue,
-       COUNT(o.id) AS orders,
-       ROUND(AVG(o.total), 2) AS avg_order_value
-FROM orders o
-WHERE o.status != 'Cancelled'
-GROUP BY month
-ORDER BY month""",
+    "revenue_trend": """SELECT NULLIF(m.month, '') AS month,
+       ROUND(m.revenue, 2) AS revenue,
+       m.orders,
+       ROUND(m.revenue / m.orders_with_total, 2) AS avg_order_value
+FROM mv_monthly_trend m
+WHERE m.orders > 0
+ORDER BY m.month""",
 
     "top_products_revenue": """SELECT p.name AS product,
        c.name AS category,
@@ -179,8 +313,7 @@ ORDER BY month""",
 FROM products p
 JOIN categories c ON c.id = p.category_id
 JOIN order_items oi ON oi.product_id = p.id
-JOIN orders o ON o.id = oi.order_id
-WHERE o.status != 'Cancelled'
+JOIN active_orders o ON o.id = oi.order_id
 GROUP BY p.id
 ORDER BY revenue DESC
 LIMIT {limit}""",
@@ -208,7 +341,7 @@ ORDER BY c.lifetime_value DESC
 LIMIT {limit}""",
 
     "order_status_breakdown": """SELECT o.status,
-       COUNT(o.id) AS order_count,
+       COUNT(*) AS order_count,
        ROUND(SUM(o.total), 2) AS total_value,
        ROUND(AVG(o.total), 2) AS avg_value
 FROM orders o
@@ -216,11 +349,10 @@ GROUP BY o.status
 ORDER BY order_count DESC""",
 
     "payment_analysis": """SELECT o.payment_method,
-       COUNT(o.id) AS usage_count,
+       COUNT(*) AS usage_count,
        ROUND(SUM(o.total), 2) AS total_processed,
        ROUND(AVG(o.total), 2) AS avg_transaction
-FROM orders o
-WHERE o.status != 'Cancelled'
+FROM active_orders o
 GROUP BY o.payment_method
 ORDER BY usage_count DESC""",
 
@@ -249,17 +381,16 @@ ORDER BY p.stock ASC""",
 FROM products p
 JOIN categories c ON c.id = p.category_id
 JOIN order_items oi ON oi.product_id = p.id
-JOIN orders o ON o.id = oi.order_id
-WHERE o.status != 'Cancelled'
+JOIN active_orders o ON o.id = oi.order_id
 GROUP BY p.id
 ORDER BY total_profit DESC
 LIMIT {limit}""",
 
-    "refund_analysis": """SELECT strftime('%Y-%m', o.order_date) AS month,
+    "refund_analysis": """SELECT substr(o.order_date, 1, 7) AS month,
        COUNT(CASE WHEN o.status = 'Refunded' THEN 1 END) AS refunds,
        COUNT(CASE WHEN o.status = 'Cancelled' THEN 1 END) AS cancellations,
-       COUNT(o.id) AS total_orders,
-       ROUND(COUNT(CASE WHEN o.status IN ('Refunded', 'Cancelled') THEN 1 END) * 100.0 / COUNT(o.id), 1) AS issue_rate_pct
+       COUNT(*) AS total_orders,
+       ROUND(COUNT(CASE WHEN o.status IN ('Refunded', 'Cancelled') THEN 1 END) * 100.0 / COUNT(*), 1) AS issue_rate_pct
 FROM orders o
 GROUP BY month
 ORDER BY month""",
@@ -280,14 +411,71 @@ GROUP BY segment
 ORDER BY avg_ltv DESC""",
 
     "general_stats": """SELECT 
-       (SELECT COUNT(*) FROM orders WHERE status != 'Cancelled') AS total_orders,
-       (SELECT ROUND(SUM(total), 2) FROM orders WHERE status != 'Cancelled') AS total_revenue,
+       COUNT(*) AS total_orders,
+       ROUND(SUM(o.total), 2) AS total_revenue,
        (SELECT COUNT(*) FROM customers) AS total_customers,
        (SELECT COUNT(*) FROM products) AS total_products,
-       (SELECT ROUND(AVG(total), 2) FROM orders WHERE status != 'Cancelled') AS avg_order_value"""
+       ROUND(AVG(o.total), 2) AS avg_order_value
+FROM active_orders o"""
 }
 
 
+# Interned so the shared template strings hash and compare by identity, and
+# read-only since every result shares them
+SQL_TEMPLATES = MappingProxyType({sys.intern(k): sys.intern(v) for k, v in SQL_TEMPLATES.items()})
+
+# Templates that take a {limit} placeholder
+LIMITED_TEMPLATES = frozenset(k for k, v in SQL_TEMPLATES.items() if "{limit}" in v)
+
+DEFAULT_LIMIT = 10
+SQL_CACHE_SIZE = 512
+
+# Templates pre-rendered with the default limit, so the common case skips str.format
+SQL_TEMPLATES_DEFAULT = MappingProxyType({
+    k: sys.intern(v.format(limit=DEFAULT_LIMIT)) if k in LIMITED_TEMPLATES else v
+    for k, v in SQL_TEMPLATES.items()
+})
+
+
+@lru_cache(maxsize=32)
+def _render(template_key: str, limit: int) -> str:
+    """Render a limited template for a non-default limit."""
+    return SQL_TEMPLATES[template_key].format(limit=limit)
+
+# Intent → template dispatch, in priority order: the first rule whose required
+# intents are all present selects the template (general_stats if none match).
+# A combined rule must come before the single-intent fallbacks for its parts,
+# or it is never reached. Rules are deliberately not re-sorted by size: e.g.
+# profit + customer + revenue must still pick profit_analysis.
+SQL_DISPATCH = tuple((frozenset(required), template) for required, template in (
+    (("trend", "revenue"), "revenue_trend"),
+    (("revenue", "category"), "revenue_by_category"),
+    (("revenue", "region"), "revenue_by_region"),
+    (("profit",), "profit_analysis"),
+    (("top_products", "rating"), "top_products_rating"),
+    (("product", "rating"), "top_products_rating"),
+    (("top_products",), "top_products_revenue"),
+    (("top_customers",), "top_customers"),
+    (("customer", "revenue"), "top_customers"),
+    (("customer",), "customer_segments"),
+    (("inventory",), "inventory_status"),
+    (("payment",), "payment_analysis"),
+    (("refund",), "refund_analysis"),
+    (("orders",), "order_status_breakdown"),
+    (("revenue",), "revenue_trend"),
+    (("trend",), "revenue_trend"),
+    (("category",), "revenue_by_category"),
+    (("region",), "revenue_by_region"),
+    (("product",), "top_products_revenue"),
+))
+
+
+@lru_cache(maxsize=1024)
+def _dispatch(intent_set: frozenset) -> str:
+    """Resolve an intent combination to its template; each combination is walked once."""
+    return next((key for required, key in SQL_DISPATCH if required <= intent_set), "general_stats")
+
+
 # =============================================================================
 # TRANSFORMATION TEMPLATES
 # =============================================================================
@@ -306,15 +494,15 @@ TRANSFORM_TEMPLATES = {
         "code": """import pandas as pd
 
 def clean_nulls(df):
-    report = {}
-    for col in df.columns:
-        null_count = df[col].isnull().sum()
-        if null_count > 0:
-            report[col] = null_count
-            if df[col].dtype in ['float64', 'int64']:
-                df[col].fillna(df[col].median(), inplace=True)
-            else:
-                df[col].fillna(df[col].mode()[0], inplace=True)
+    nulls = df.isnull().sum()
+    nulls = nulls[nulls > 0]
+    report = nulls.to_dict()
+    num_cols = df.select_dtypes(include='number').columns.intersection(nulls.index)
+    cat_cols = nulls.index.difference(num_cols)
+    fills = df[num_cols].median().to_dict()
+    if len(cat_cols):
+        fills.update(df[cat_cols].mode().iloc[0].to_dict())
+    df = df.fillna(fills)
     return df, report"""
     },
     "normalize_prices": {
@@ -349,16 +537,32 @@ def normalize_prices(df, price_cols):
             "Calculate period-over-period growth rates"
         ],
         "code": """import pandas as pd
+import numpy as np
 
-def aggregate_revenue(df, period='M'):
-    df['order_date'] = pd.to_datetime(df['order_date'])
-    agg = df.groupby(df['order_date'].dt.to_period(period)).agg(
-        revenue=('total', 'sum'),
-        orders=('id', 'count'),
-        avg_order=('total', 'mean')
-    ).reset_index()
-    agg['running_total'] = agg['revenue'].cumsum()
-    agg['growth_pct'] = agg['revenue'].pct_change() * 100
+def aggregate_revenue(df, period='M', engine=None):
+    # period is a pandas period alias: 'D', 'W', 'M', 'Q' or 'Y'.
+    # engine='numba' runs the sums/means as one parallel JIT-compiled loop; the
+    # first call pays the compile cost, so warm it up once on a tiny frame.
+    engine_kwargs = {'parallel': True, 'nogil': True} if engine == 'numba' else None
+    dates = pd.to_datetime(df['order_date'])
+    if period in ('D', 'M', 'Y'):
+        # Same calendar buckets as to_period, truncated natively by NumPy
+        periods = dates.to_numpy().astype(f'datetime64[{period}]')
+    else:
+        # NumPy has no quarter unit and anchors weeks on Thursday, so quarters
+        # and Monday-Sunday weeks go through pandas periods
+        periods = dates.dt.to_period(period)
+    g = df.groupby(periods)
+    agg = pd.DataFrame({
+        'revenue': g['total'].sum(engine=engine, engine_kwargs=engine_kwargs),
+        'orders': g['id'].count(),
+        'avg_order': g['total'].mean(engine=engine, engine_kwargs=engine_kwargs),
+    }).rename_axis('order_date').reset_index()
+    rev = agg['revenue'].to_numpy()
+    growth = np.full(rev.size, np.nan)
+    growth[1:] = np.diff(rev) / rev[:-1] * 100
+    agg['running_total'] = np.cumsum(rev)
+    agg['growth_pct'] = growth
     return agg"""
     },
     "customer_rfm": {
@@ -372,23 +576,34 @@ def aggregate_revenue(df, period='M'):
             "Assign customer segments based on combined RFM score"
         ],
         "code": """import pandas as pd
+import numpy as np
 from datetime import datetime
 
-def rfm_segmentation(orders_df, reference_date=None):
+def quintile_scores(values, reverse=False):
+    # Same right-closed bins as pd.qcut(q=5), scored with one binary search
+    cuts = np.quantile(values, [0.2, 0.4, 0.6, 0.8])
+    scores = np.searchsorted(cuts, values) + 1
+    return 6 - scores if reverse else scores
+
+def rfm_segmentation(orders_df, reference_date=None, engine=None):
     if reference_date is None:
         reference_date = datetime.now()
+    # engine='numba': parallel JIT-compiled monetary sums (compiled on first call)
+    engine_kwargs = {'parallel': True, 'nogil': True} if engine == 'numba' else None
     
-    rfm = orders_df.groupby('customer_id').agg(
-        recency=('order_date', lambda x: (reference_date - pd.to_datetime(x).max()).days),
-        frequency=('id', 'count'),
-        monetary=('total', 'sum')
-    ).reset_index()
+    # Parse dates once up front so the per-customer max is a native aggregation
+    orders_df = orders_df.assign(order_date=pd.to_datetime(orders_df['order_date']))
+    g = orders_df.groupby('customer_id')
+    rfm = pd.DataFrame({
+        'recency': (reference_date - g['order_date'].max()).dt.days,
+        'frequency': g['id'].count(),
+        'monetary': g['total'].sum(engine=engine, engine_kwargs=engine_kwargs),
+    }).reset_index()
     
     for col in ['recency', 'frequency', 'monetary']:
-        ascending = col == 'recency'
-        rfm[f'{col}_score'] = pd.qcut(rfm[col], q=5, labels=[5,4,3,2,1] if ascending else [1,2,3,4,5])
+        rfm[f'{col}_score'] = quintile_scores(rfm[col].to_numpy(), reverse=col == 'recency')
     
-    rfm['rfm_score'] = rfm['recency_score'].astype(int) + rfm['frequency_score'].astype(int) + rfm['monetary_score'].astype(int)
+    rfm['rfm_score'] = rfm['recency_score'] + rfm['frequency_score'] + rfm['monetary_score']
     return rfm"""
     },
     "deduplicate": {
@@ -402,12 +617,18 @@ def rfm_segmentation(orders_df, reference_date=None):
         ],
         "code": """import pandas as pd
 
-def deduplicate(df, key_cols=None):
+def deduplicate(df, key_cols=None, exact=False):
+    # One 64-bit hash per row, so duplicates are found with a hash set instead
+    # of column-by-column comparisons. A hash collision (odds ~n^2/2^64) could
+    # drop a distinct row; exact=True re-compares the rows that share a hash.
     before = len(df)
-    if key_cols:
-        df = df.drop_duplicates(subset=key_cols, keep='first')
-    else:
-        df = df.drop_duplicates(keep='first')
+    subset = df[key_cols] if key_cols else df
+    hashes = pd.util.hash_pandas_object(subset, index=False)
+    dup = hashes.duplicated(keep='first').to_numpy()
+    if exact and dup.any():
+        shared = hashes.duplicated(keep=False).to_numpy()
+        dup[shared] = subset[shared].duplicated(keep='first').to_numpy()
+    df = df[~dup]
     after = len(df)
     return df, {'removed': before - after, 'remaining': after}"""
     },
@@ -421,16 +642,31 @@ def deduplicate(df, key_cols=None):
             "Calculate days_since_epoch for ML features"
         ],
         "code": """import pandas as pd
+import numpy as np
+
+DAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
 
 def enrich_dates(df, date_col='order_date'):
-    df[date_col] = pd.to_datetime(df[date_col])
-    df['year'] = df[date_col].dt.year
-    df['month'] = df[date_col].dt.month
-    df['day'] = df[date_col].dt.day
-    df['day_of_week'] = df[date_col].dt.day_name()
-    df['quarter'] = df[date_col].dt.quarter
-    df['is_weekend'] = df[date_col].dt.weekday >= 5
-    return df"""
+    dates = pd.to_datetime(df[date_col])
+    days = dates.to_numpy().astype('datetime64[D]')
+    # NaT casts to INT64_MIN below, so those rows are masked to <NA>
+    missing = np.isnat(days)
+    months = days.astype('datetime64[M]')
+    month = months.astype(np.int64) % 12 + 1
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+
+    def nullable(values):
+        return pd.arrays.IntegerArray(values.astype(np.int64), missing.copy())
+
+    return df.assign(**{
+        date_col: dates,
+        'year': nullable(days.astype('datetime64[Y]').astype(np.int64) + 1970),
+        'month': nullable(month),
+        'day': nullable((days - months).astype(np.int64) + 1),
+        'day_of_week': np.where(missing, None, DAY_NAMES[weekday]),
+        'quarter': nullable((month - 1) // 3 + 1),
+        'is_weekend': pd.arrays.BooleanArray(weekday >= 5, missing.copy()),
+    })"""
     },
 }
 
@@ -490,6 +726,58 @@ QUALITY_RULES = {
     }
 }
 
+# Results hand out references to these, so callers get read-only views
+TRANSFORM_TEMPLATES = _freeze(TRANSFORM_TEMPLATES)
+QUALITY_RULES = _freeze(QUALITY_RULES)
+
+
+# =============================================================================
+# KEYWORD MAPS — Prompt keywords that select transforms / quality categories
+# =============================================================================
+
+TRANSFORM_KEYWORDS = {
+    "clean_nulls": ["null", "missing", "empty", "clean", "fill", "nan"],
+    "normalize_prices": ["normalize", "price", "standardize", "decimal", "outlier"],
+    "aggregate_revenue": ["aggregate", "group", "summarize", "revenue", "total", "sum"],
+    "customer_rfm": ["rfm", "segment", "recency", "frequency", "monetary", "customer segment"],
+    "deduplicate": ["duplicate", "dedup", "unique", "remove duplicate", "distinct"],
+    "enrich_dates": ["date", "temporal", "time", "day of week", "quarter", "month", "year", "feature"],
+}
+
+QUALITY_KEYWORDS = {
+    "completeness": ["complete", "null", "missing", "empty", "required"],
+    "consistency": ["consistent", "match", "correct", "valid calculation", "logic"],
+    "validity": ["valid", "range", "boundary", "limit", "constraint", "format"],
+    "uniqueness": ["unique", "duplicate", "distinct", "primary key"],
+    "timeliness": ["fresh", "recent", "timely", "date range", "outdated"],
+}
+
+
+def _keyword_scanner(keyword_map: Dict[str, List[str]]):
+    """Build a single-pass matcher for every keyword in keyword_map.
+
+    Keywords match as substrings, like `kw in text`. The regex tries the longest
+    keyword first at each position, so each hit also implies the shorter
+    keywords that are its prefix ("date range" -> "date").
+    """
+    keywords = sorted({kw for kws in keyword_map.values() for kw in kws}, key=len, reverse=True)
+    pattern = re.compile("(?=(" + "|".join(map(re.escape, keywords)) + "))")
+    implied = {kw: frozenset(k for k in keywords if kw.startswith(k)) for kw in keywords}
+    return pattern, implied
+
+
+def _find_keywords(scanner, text: str) -> set:
+    """Return the set of scanner keywords occurring anywhere in text."""
+    pattern, implied = scanner
+    found = set()
+    for m in pattern.finditer(text):
+        found |= implied[m.group(1)]
+    return found
+
+
+TRANSFORM_KEYWORD_SCANNER = _keyword_scanner(TRANSFORM_KEYWORDS)
+QUALITY_KEYWORD_SCANNER = _keyword_scanner(QUALITY_KEYWORDS)
+
 
 # =============================================================================
 # PROMPT ENGINE — Core logic
@@ -501,26 +789,61 @@ class PromptEngine:
     Demonstrates production-grade prompt patterns without requiring external LLM APIs.
     """
 
+    __slots__ = (
+        "sql_templates", "transform_templates", "quality_rules", "intent_patterns", "entity_patterns",
+        "_intent_patterns_compiled", "_entity_patterns_compiled", "_transform_kw_sets", "_quality_kw_sets",
+        "_generate_sql_cached",
+    )
+
     def __init__(self):
         self.sql_templates = SQL_TEMPLATES
         self.transform_templates = TRANSFORM_TEMPLATES
         self.quality_rules = QUALITY_RULES
         self.intent_patterns = INTENT_PATTERNS
         self.entity_patterns = ENTITY_PATTERNS
+        # Compiled once per engine; the patterns carry their own (?i) flags
+        self._intent_patterns_compiled = {k: re.compile(p) for k, p in self.intent_patterns.items()}
+        self._entity_patterns_compiled = {k: re.compile(p) for k, p in self.entity_patterns.items()}
+        self._transform_kw_sets = {k: frozenset(v) for k, v in TRANSFORM_KEYWORDS.items()}
+        self._quality_kw_sets = {k: frozenset(v) for k, v in QUALITY_KEYWORDS.items()}
+        # Per-engine memo of generate_sql, keyed on the exact prompt text
+        self._generate_sql_cached = lru_cache(maxsize=SQL_CACHE_SIZE)(self._generate_sql)
+
+    def ensure_views(self, conn):
+        """Create the views the SQL templates depend on, if missing."""
+        for ddl in SQL_VIEWS.values():
+            conn.execute(ddl)
+        conn.commit()
+
+    def ensure_indexes(self, conn):
+        """Create the template covering indexes, if missing, and gather stats for new ones."""
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        for name, ddl in SQL_INDEXES.items():
+            if name not in existing:
+                conn.execute(ddl)
+                conn.execute(f"ANALYZE {name}")
+        conn.commit()
 
     def classify_intent(self, prompt: str) -> List[str]:
         """Classify the user's intent from their natural language prompt."""
-        intents = []
-        for intent, pattern in self.intent_patterns.items():
-            if re.search(pattern, prompt):
-                intents.append(intent)
+        found = set()
+        for m in INTENT_KEYWORD_RE.finditer(prompt):
+            found |= _keyword_intents(m.group(1))
+        for intent in INTENT_REGEX_ONLY:
+            if self._intent_patterns_compiled[intent].search(prompt):
+                found.add(intent)
+        intents = [intent for intent in self.intent_patterns if intent in found]
         return intents if intents else ["general"]
 
     def extract_entities(self, prompt: str) -> Dict:
         """Extract structured entities from the prompt."""
+        # findall per type can return overlapping matches across types, so the
+        # combined scan only short-circuits prompts with no entities at all
+        if not ENTITY_RE.search(prompt):
+            return {}
         entities = {}
-        for entity_type, pattern in self.entity_patterns.items():
-            matches = re.findall(pattern, prompt)
+        for entity_type, pattern in self._entity_patterns_compiled.items():
+            matches = pattern.findall(prompt)
             if matches:
                 entities[entity_type] = matches
         return entities
@@ -533,9 +856,24 @@ class PromptEngine:
         3. Template matching with few-shot examples
         4. Chain-of-thought reasoning trace
         """
+        sql, template_used, intents, entities, reasoning_steps, best_example = self._generate_sql_cached(prompt)
+
+        return {
+            "sql": sql,
+            "template": template_used,
+            "intents": list(intents),
+            "entities": {k: list(v) for k, v in entities},
+            "reasoning": list(reasoning_steps),
+            "system_prompt": SQL_SYSTEM_PROMPT,
+            "similar_example": best_example,
+            "prompt_technique": "Few-shot + Chain-of-thought + Role prompting"
+        }
+
+    def _generate_sql(self, prompt: str) -> tuple:
+        """Do the generate_sql work, returning only immutable parts so results can be cached."""
         intents = self.classify_intent(prompt)
         entities = self.extract_entities(prompt)
-        limit = 10
+        limit = DEFAULT_LIMIT
         if "number" in entities:
             limit = int(entities["number"][0])
 
@@ -545,106 +883,37 @@ class PromptEngine:
             f"2. Extracted entities: {entities}",
         ]
 
-        # Template selection based on intent combination
-        sql = ""
-        template_used = ""
-
-        if "trend" in intents and "revenue" in intents:
-            sql = self.sql_templates["revenue_trend"]
-            template_used = "revenue_trend"
-        elif "revenue" in intents and "category" in intents:
-            sql = self.sql_templates["revenue_by_category"]
-            template_used = "revenue_by_category"
-        elif "revenue" in intents and "region" in intents:
-            sql = self.sql_templates["revenue_by_region"]
-            template_used = "revenue_by_region"
-        elif "profit" in intents:
-            sql = self.sql_templates["profit_analysis"].format(limit=limit)
-            template_used = "profit_analysis"
-        elif "top_products" in intents or ("product" in intents and "rating" in intents):
-            if "rating" in intents:
-                sql = self.sql_templates["top_products_rating"].format(limit=limit)
-                template_used = "top_products_rating"
-            else:
-                sql = self.sql_templates["top_products_revenue"].format(limit=limit)
-                template_used = "top_products_revenue"
-        elif "top_customers" in intents or ("customer" in intents and "revenue" in intents):
-            sql = self.sql_templates["top_customers"].format(limit=limit)
-            template_used = "top_customers"
-        elif "customer" in intents:
-            sql = self.sql_templates["customer_segments"]
-            template_used = "customer_segments"
-        elif "inventory" in intents:
-            sql = self.sql_templates["inventory_status"]
-            template_used = "inventory_status"
-        elif "payment" in intents:
-            sql = self.sql_templates["payment_analysis"]
-            template_used = "payment_analysis"
-        elif "refund" in intents:
-            sql = self.sql_templates["refund_analysis"]
-            template_used = "refund_analysis"
-        elif "orders" in intents:
-            sql = self.sql_templates["order_status_breakdown"]
-            template_used = "order_status_breakdown"
-        elif "revenue" in intents:
-            sql = self.sql_templates["revenue_trend"]
-            template_used = "revenue_trend"
-        elif "trend" in intents:
-            sql = self.sql_templates["revenue_trend"]
-            template_used = "revenue_trend"
-        elif "category" in intents:
-            sql = self.sql_templates["revenue_by_category"]
-            template_used = "revenue_by_category"
-        elif "region" in intents:
-            sql = self.sql_templates["revenue_by_region"]
-            template_used = "revenue_by_region"
-        elif "product" in intents:
-            sql = self.sql_templates["top_products_revenue"].format(limit=limit)
-            template_used = "top_products_revenue"
+        # Template selection based on intent combination: first rule whose
+        # required intents are all present wins
+        template_used = _dispatch(frozenset(intents))
+        if limit == DEFAULT_LIMIT or template_used not in LIMITED_TEMPLATES:
+            sql = SQL_TEMPLATES_DEFAULT[template_used]
         else:
-            sql = self.sql_templates["general_stats"]
-            template_used = "general_stats"
+            sql = _render(template_used, limit)
 
         reasoning_steps.append(f"3. Selected template: {template_used}")
         reasoning_steps.append(f"4. Applied limit: {limit}")
 
         # Find most relevant few-shot example
-        best_example = None
-        prompt_lower = prompt.lower()
-        for ex in SQL_FEW_SHOT_EXAMPLES:
-            if any(word in prompt_lower for word in ex["input"].lower().split()):
-                best_example = ex
-                break
+        best_example = _match_few_shot(prompt.lower())
 
-        return {
-            "sql": sql,
-            "template": template_used,
-            "intents": intents,
-            "entities": entities,
-            "reasoning": reasoning_steps,
-            "system_prompt": SQL_SYSTEM_PROMPT,
-            "similar_example": best_example,
-            "prompt_technique": "Few-shot + Chain-of-thought + Role prompting"
-        }
+        return (
+            sql,
+            template_used,
+            tuple(intents),
+            tuple((k, tuple(v)) for k, v in entities.items()),
+            tuple(reasoning_steps),
+            best_example,
+        )
 
     def generate_transform(self, prompt: str) -> Dict:
         """Generate data transformation code from natural language description."""
-        prompt_lower = prompt.lower()
-        matches = []
-
-        keywords_map = {
-            "clean_nulls": ["null", "missing", "empty", "clean", "fill", "nan"],
-            "normalize_prices": ["normalize", "price", "standardize", "decimal", "outlier"],
-            "aggregate_revenue": ["aggregate", "group", "summarize", "revenue", "total", "sum"],
-            "customer_rfm": ["rfm", "segment", "recency", "frequency", "monetary", "customer segment"],
-            "deduplicate": ["duplicate", "dedup", "unique", "remove duplicate", "distinct"],
-            "enrich_dates": ["date", "temporal", "time", "day of week", "quarter", "month", "year", "feature"],
-        }
-
-        for template_key, keywords in keywords_map.items():
-            score = sum(1 for kw in keywords if kw in prompt_lower)
-            if score > 0:
-                matches.append((template_key, score))
+        found = _find_keywords(TRANSFORM_KEYWORD_SCANNER, prompt.lower())
+        matches = [
+            (template_key, len(keywords & found))
+            for template_key, keywords in self._transform_kw_sets.items()
+            if not keywords.isdisjoint(found)
+        ]
 
         matches.sort(key=lambda x: x[1], reverse=True)
 
@@ -666,20 +935,11 @@ class PromptEngine:
 
     def generate_quality_rules(self, prompt: str) -> Dict:
         """Generate data quality rules based on context."""
-        prompt_lower = prompt.lower()
-        selected_categories = []
-
-        category_keywords = {
-            "completeness": ["complete", "null", "missing", "empty", "required"],
-            "consistency": ["consistent", "match", "correct", "valid calculation", "logic"],
-            "validity": ["valid", "range", "boundary", "limit", "constraint", "format"],
-            "uniqueness": ["unique", "duplicate", "distinct", "primary key"],
-            "timeliness": ["fresh", "recent", "timely", "date range", "outdated"],
-        }
-
-        for cat_key, keywords in category_keywords.items():
-            if any(kw in prompt_lower for kw in keywords):
-                selected_categories.append(cat_key)
+        found = _find_keywords(QUALITY_KEYWORD_SCANNER, prompt.lower())
+        selected_categories = [
+            cat_key for cat_key, keywords in self._quality_kw_sets.items()
+            if not keywords.isdisjoint(found)
+        ]
 
         if not selected_categories:
             selected_categories = list(self.quality_rules.keys())
@@ -5,56 +5,81 @@ Generates realistic orders, products, customers, and categories for DataForge AI
 
 import sqlite3
 import random
-import os
-from datetime import datetime, timedelta
-
-CATEGORIES = [
-    {"id": 1, "name": "Electronics", "margin": 0.22},
-    {"id": 2, "name": "Clothing & Apparel", "margin": 0.45},
-    {"id": 3, "name": "Home & Kitchen", "margin": 0.35},
-    {"id": 4, "name": "Books & Media", "margin": 0.40},
-    {"id": 5, "name": "Sports & Outdoors", "margin": 0.30},
-    {"id": 6, "name": "Beauty & Health", "margin": 0.50},
-    {"id": 7, "name": "Toys & Games", "margin": 0.38},
-    {"id": 8, "name": "Automotive", "margin": 0.25},
-]
-
-PRODUCTS = [
-    {"name": "Wireless Bluetooth Headphones", "category_id": 1, "price": 79.99, "cost": 35.00},
-    {"name": "Smart Watch Pro", "category_id": 1, "price": 249.99, "cost": 120.00},
-    {"name": "USB-C Hub Adapter", "category_id": 1, "price": 34.99, "cost": 12.00},
-    {"name": "Portable Charger 20000mAh", "category_id": 1, "price": 44.99, "cost": 18.00},
-    {"name": "Noise Cancelling Earbuds", "category_id": 1, "price": 129.99, "cost": 55.00},
-    {"name": "4K Action Camera", "category_id": 1, "price": 199.99, "cost": 90.00},
-    {"name": "Men's Running Jacket", "category_id": 2, "price": 89.99, "cost": 32.00},
-    {"name": "Women's Yoga Pants", "category_id": 2, "price": 49.99, "cost": 15.00},
-    {"name": "Cotton Graphic T-Shirt", "category_id": 2, "price": 24.99, "cost": 8.00},
-    {"name": "Leather Crossbody Bag", "category_id": 2, "price": 64.99, "cost": 22.00},
-    {"name": "Winter Puffer Coat", "category_id": 2, "price": 149.99, "cost": 55.00},
-    {"name": "Stainless Steel Cookware Set", "category_id": 3, "price": 199.99, "cost": 85.00},
-    {"name": "Robot Vacuum Cleaner", "category_id": 3, "price": 299.99, "cost": 140.00},
-    {"name": "Memory Foam Pillow (2-Pack)", "category_id": 3, "price": 39.99, "cost": 14.00},
-    {"name": "Air Purifier HEPA Filter", "category_id": 3, "price": 159.99, "cost": 65.00},
-    {"name": "LED Desk Lamp", "category_id": 3, "price": 29.99, "cost": 10.00},
-    {"name": "Python Data Science Handbook", "category_id": 4, "price": 44.99, "cost": 18.00},
-    {"name": "The Art of SQL", "category_id": 4, "price": 39.99, "cost": 16.00},
-    {"name": "Data Engineering with Python", "category_id": 4, "price": 49.99, "cost": 20.00},
-    {"name": "Machine Learning Yearning", "category_id": 4, "price": 29.99, "cost": 12.00},
-    {"name": "Adjustable Dumbbell Set", "category_id": 5, "price": 179.99, "cost": 80.00},
-    {"name": "Camping Tent 4-Person", "category_id": 5, "price": 129.99, "cost": 50.00},
-    {"name": "Yoga Mat Premium", "category_id": 5, "price": 34.99, "cost": 12.00},
-    {"name": "Cycling Helmet", "category_id": 5, "price": 59.99, "cost": 22.00},
-    {"name": "Vitamin C Serum", "category_id": 6, "price": 24.99, "cost": 6.00},
-    {"name": "Electric Toothbrush", "category_id": 6, "price": 69.99, "cost": 25.00},
-    {"name": "Organic Shampoo Set", "category_id": 6, "price": 32.99, "cost": 10.00},
-    {"name": "Sunscreen SPF 50", "category_id": 6, "price": 14.99, "cost": 4.00},
-    {"name": "LEGO Architecture Set", "category_id": 7, "price": 89.99, "cost": 40.00},
-    {"name": "Board Game Collection", "category_id": 7, "price": 49.99, "cost": 18.00},
-    {"name": "RC Racing Car", "category_id": 7, "price": 44.99, "cost": 16.00},
-    {"name": "Car Phone Mount", "category_id": 8, "price": 19.99, "cost": 5.00},
-    {"name": "Dash Cam HD", "category_id": 8, "price": 79.99, "cost": 30.00},
-    {"name": "Tire Pressure Gauge Digital", "category_id": 8, "price": 12.99, "cost": 4.00},
-]
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+from data_pipeline import PIPELINE_RUNS_DDL, runs_db_path
+
+
+class Category(NamedTuple):
+    """A seeded product category and its typical margin."""
+    id: int
+    name: str
+    margin: float
+
+
+class Product(NamedTuple):
+    """A seeded catalogue product; its id is its 1-based position in PRODUCTS."""
+    name: str
+    category_id: int
+    price: float
+    cost: float
+
+
+CATEGORIES = (
+    Category(1, "Electronics", 0.22),
+    Category(2, "Clothing & Apparel", 0.45),
+    Category(3, "Home & Kitchen", 0.35),
+    Category(4, "Books & Media", 0.40),
+    Category(5, "Sports & Outdoors", 0.30),
+    Category(6, "Beauty & Health", 0.50),
+    Category(7, "Toys & Games", 0.38),
+    Category(8, "Automotive", 0.25),
+)
+
+PRODUCTS = (
+    Product("Wireless Bluetooth Headphones", 1, 79.99, 35.00),
+    Product("Smart Watch Pro", 1, 249.99, 120.00),
+    Product("USB-C Hub Adapter", 1, 34.99, 12.00),
+    Product("Portable Charger 20000mAh", 1, 44.99, 18.00),
+    Product("Noise Cancelling Earbuds", 1, 129.99, 55.00),
+    Product("4K Action Camera", 1, 199.99, 90.00),
+    Product("Men's Running Jacket", 2, 89.99, 32.00),
+    Product("Women's Yoga Pants", 2, 49.99, 15.00),
+    Product("Cotton Graphic T-Shirt", 2, 24.99, 8.00),
+    Product("Leather Crossbody Bag", 2, 64.99, 22.00),
+    Product("Winter Puffer Coat", 2, 149.99, 55.00),
+    Product("Stainless Steel Cookware Set", 3, 199.99, 85.00),
+    Product("Robot Vacuum Cleaner", 3, 299.99, 140.00),
+    Product("Memory Foam Pillow (2-Pack)", 3, 39.99, 14.00),
+    Product("Air Purifier HEPA Filter", 3, 159.99, 65.00),
+    Product("LED Desk Lamp", 3, 29.99, 10.00),
+    Product("Python Data Science Handbook", 4, 44.99, 18.00),
+    Product("The Art of SQL", 4, 39.99, 16.00),
+    Product("Data Engineering with Python", 4, 49.99, 20.00),
+    Product("Machine Learning Yearning", 4, 29.99, 12.00),
+    Product("Adjustable Dumbbell Set", 5, 179.99, 80.00),
+    Product("Camping Tent 4-Person", 5, 129.99, 50.00),
+    Product("Yoga Mat Premium", 5, 34.99, 12.00),
+    Product("Cycling Helmet", 5, 59.99, 22.00),
+    Product("Vitamin C Serum", 6, 24.99, 6.00),
+    Product("Electric Toothbrush", 6, 69.99, 25.00),
+    Product("Organic Shampoo Set", 6, 32.99, 10.00),
+    Product("Sunscreen SPF 50", 6, 14.99, 4.00),
+    Product("LEGO Architecture Set", 7, 89.99, 40.00),
+    Product("Board Game Collection", 7, 49.99, 18.00),
+    Product("RC Racing Car", 7, 44.99, 16.00),
+    Product("Car Phone Mount", 8, 19.99, 5.00),
+    Product("Dash Cam HD", 8, 79.99, 30.00),
+    Product("Tire Pressure Gauge Digital", 8, 12.99, 4.00),
+)
+
+# Column-wise views of PRODUCTS (indexed by product id - 1) for the seed loops
+_NAMES = tuple(p.name for p in PRODUCTS)
+_CAT_IDS = tuple(p.category_id for p in PRODUCTS)
+_PRICES = tuple(p.price for p in PRODUCTS)
+_COSTS = tuple(p.cost for p in PRODUCTS)
 
 FIRST_NAMES = [
     "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda",
@@ -85,19 +110,115 @@ CITIES = {
 ORDER_STATUSES = ["Completed", "Processing", "Shipped", "Cancelled", "Refunded"]
 PAYMENT_METHODS = ["Credit Card", "PayPal", "Debit Card", "Apple Pay", "Google Pay", "Bank Transfer"]
 
+# Connection settings for bulk seeding: WAL (which the app uses anyway), no
+# fsync, in-memory temp B-trees and a ~200 MB page cache. synchronous=OFF only
+# applies to the seeding connection; pass tune=False to keep SQLite defaults.
+SEED_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=OFF",
+    "temp_store=MEMORY",
+    "cache_size=-200000",
+)
+
+# The fixed categories as one literal multi-row INSERT. The values are module
+# constants, never user input, so they are inlined rather than bound.
+SQL_INSERT_CATEGORIES = "INSERT INTO categories (id, name, margin) VALUES " + ", ".join(
+    "({}, '{}', {!r})".format(cat.id, cat.name.replace("'", "''"), cat.margin)
+    for cat in CATEGORIES
+)
+
+# Row inserts used by seed_data. Kept as constants so every call passes the
+# same SQL text and is served from the connection's statement cache.
+SQL_INSERT_PRODUCT = """INSERT INTO products (name, category_id, price, cost, stock, rating, reviews_count, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+CUSTOMER_COLUMNS = ("first_name", "last_name", "email", "region", "city", "signup_date")
+ORDER_COLUMNS = ("id", "customer_id", "order_date", "status", "payment_method", "discount", "region")
+ORDER_ITEM_COLUMNS = ("order_id", "product_id", "quantity", "unit_price", "line_total")
+
+# Rows per multi-row INSERT in seed_data, further capped per table so a
+# statement never binds more than SQLITE_MAX_VARIABLES parameters (the
+# compile-time default of SQLite builds before 3.32)
+SEED_BATCH_SIZE = 500
+SQLITE_MAX_VARIABLES = 999
+
+# Built by seed_data once the bulk inserts are done, ahead of the updates that
+# aggregate orders and order_items, instead of being maintained row by row
+INDEX_ORDERITEMS_ORDER = "CREATE INDEX IF NOT EXISTS idx_orderitems_order ON order_items(order_id, product_id, line_total)"
+INDEX_ORDERS_CUSTOMER = "CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id)"
+# Enforces customers.email uniqueness; the column itself is declared without
+# UNIQUE so the index is built once the customers are on disk
+INDEX_CUSTOMERS_EMAIL = "CREATE UNIQUE INDEX IF NOT EXISTS idx_customers_email ON customers(email)"
+
+# Tables filled by seed_data, in the order they are copied from the in-memory
+# staging database to disk
+SEED_TABLES = ("categories", "products", "customers", "orders", "order_items", "datasets")
+
+# Covering indexes for the dashboard KPI and pipeline validation queries
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_orders_status_region ON orders(status, region, total)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_status_date ON orders(status, order_date, total)",
+    INDEX_ORDERITEMS_ORDER,
+    INDEX_ORDERS_CUSTOMER,
+    "CREATE INDEX IF NOT EXISTS idx_products_cat ON products(category_id, id)",
+]
+
+
+# Derive every seeded order's subtotal, discount, tax and total from its line
+# items in set-based passes. Until they run, orders.discount holds the drawn
+# discount rate rather than an amount. Each statement reads the columns set by
+# the one before, and correlated subqueries rather than UPDATE ... FROM keep
+# them working on SQLite builds older than 3.33.
+SQL_ORDER_AMOUNTS = (
+    "UPDATE orders SET subtotal = (SELECT SUM(line_total) FROM order_items WHERE order_id = orders.id)",
+    "UPDATE orders SET discount = ROUND(subtotal * discount, 2)",
+    """UPDATE orders SET
+        tax = ROUND((subtotal - discount) * 0.08, 2),
+        total = ROUND(subtotal - discount + ROUND((subtotal - discount) * 0.08, 2), 2)""",
+)
+
+
+def _iso_days(start: date, end: date) -> list:
+    """Return the ISO date string of every day from start to end inclusive."""
+    first = start.toordinal()
+    return [date.fromordinal(d).isoformat() for d in range(first, end.toordinal() + 1)]
+
+
+def _multi_values_insert(c: sqlite3.Cursor, table: str, cols: tuple, rows: list, max_per_stmt: int):
+    """Insert rows with INSERT ... VALUES statements of up to max_per_stmt rows each."""
+    per_stmt = max(1, min(max_per_stmt, SQLITE_MAX_VARIABLES // len(cols)))
+    row_sql = "(" + ", ".join("?" * len(cols)) + ")"
+    head = f"INSERT INTO {table} ({', '.join(cols)}) VALUES "
+    for start in range(0, len(rows), per_stmt):
+        chunk = rows[start:start + per_stmt]
+        c.execute(head + ", ".join([row_sql] * len(chunk)), [v for row in chunk for v in row])
+
+
+def _apply_seed_pragmas(c: sqlite3.Cursor):
+    for pragma in SEED_PRAGMAS:
+        c.execute(f"PRAGMA {pragma}")
 
-def create_tables(db_path: str):
+
+def create_tables(db_path: str, tune: bool = True):
     """Create all database tables."""
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
 
+    # Only takes effect while the file is still empty (and never once in WAL mode)
+    c.execute("PRAGMA page_size=8192")
+    if tune:
+        _apply_seed_pragmas(c)
+    c.execute("ATTACH DATABASE ? AS runs", (runs_db_path(db_path),))
+
     c.execute("DROP TABLE IF EXISTS order_items")
     c.execute("DROP TABLE IF EXISTS orders")
     c.execute("DROP TABLE IF EXISTS customers")
     c.execute("DROP TABLE IF EXISTS products")
     c.execute("DROP TABLE IF EXISTS categories")
     c.execute("DROP TABLE IF EXISTS datasets")
-    c.execute("DROP TABLE IF EXISTS pipeline_runs")
+    c.execute("DROP TABLE IF EXISTS main.pipeline_runs")  # pre-split location
+    c.execute("DROP TABLE IF EXISTS runs.pipeline_runs")
+    for mv in SUMMARY_TABLE_NAMES:
+        c.execute(f"DROP TABLE IF EXISTS {mv}")
 
     c.execute("""
         CREATE TABLE categories (
@@ -127,7 +248,7 @@ def create_tables(db_path: str):
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             first_name TEXT NOT NULL,
             last_name TEXT NOT NULL,
-            email TEXT UNIQUE,
+            email TEXT,
             region TEXT,
             city TEXT,
             signup_date TEXT,
@@ -177,111 +298,324 @@ def create_tables(db_path: str):
         )
     """)
 
-    c.execute("""
-        CREATE TABLE pipeline_runs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            pipeline_name TEXT NOT NULL,
-            status TEXT NOT NULL,
-            started_at TEXT,
-            completed_at TEXT,
-            records_processed INTEGER DEFAULT 0,
-            errors INTEGER DEFAULT 0,
-            stage TEXT DEFAULT 'idle'
-        )
-    """)
+    c.execute(PIPELINE_RUNS_DDL)
 
     conn.commit()
     conn.close()
 
 
-def seed_data(db_path: str):
-    """Seed the database with sample e-commerce data."""
+# Dashboard summary tables, kept current by the triggers below so the KPI
+# endpoint reads pre-aggregated rows instead of scanning orders. Only
+# non-cancelled orders count towards revenue; mv_order_status counts all.
+# orders_with_total counts the orders whose total is not NULL; it is the
+# denominator for average order value, matching AVG(total).
+SUMMARY_TABLE_NAMES = ("mv_revenue_by_region", "mv_monthly_trend", "mv_payment_methods",
+                       "mv_order_status", "mv_revenue_by_product")
+SUMMARY_TABLES = [
+    """CREATE TABLE IF NOT EXISTS mv_revenue_by_region (
+        region TEXT PRIMARY KEY, revenue REAL NOT NULL DEFAULT 0, orders INTEGER NOT NULL DEFAULT 0,
+        orders_with_total INTEGER NOT NULL DEFAULT 0)""",
+    """CREATE TABLE IF NOT EXISTS mv_monthly_trend (
+        month TEXT PRIMARY KEY, revenue REAL NOT NULL DEFAULT 0, orders INTEGER NOT NULL DEFAULT 0,
+        orders_with_total INTEGER NOT NULL DEFAULT 0)""",
+    """CREATE TABLE IF NOT EXISTS mv_payment_methods (
+        payment_method TEXT PRIMARY KEY, revenue REAL NOT NULL DEFAULT 0, orders INTEGER NOT NULL DEFAULT 0,
+        orders_with_total INTEGER NOT NULL DEFAULT 0)""",
+    """CREATE TABLE IF NOT EXISTS mv_order_status (
+        status TEXT PRIMARY KEY, orders INTEGER NOT NULL DEFAULT 0)""",
+    # Keyed by product so category revenue stays right if a product is recategorised
+    """CREATE TABLE IF NOT EXISTS mv_revenue_by_product (
+        product_id INTEGER PRIMARY KEY, revenue REAL NOT NULL DEFAULT 0, items INTEGER NOT NULL DEFAULT 0)""",
+]
+
+# Statements that add / remove one order's contribution, for use in trigger bodies.
+# NULL keys are stored as '' (product 0) and NULL amounts count as 0, so the
+# triggers never reject a write to the base tables, NULL-keyed rows merge and
+# back out like any other group, and the results match SUMMARY_REFRESH.
+_ADD_ORDER = """
+    INSERT INTO mv_revenue_by_region (region, revenue, orders, orders_with_total)
+        VALUES (COALESCE({r}.region, ''), COALESCE({r}.total, 0), 1, {r}.total IS NOT NULL)
+        ON CONFLICT(region) DO UPDATE SET revenue = revenue + excluded.revenue, orders = orders + 1,
+            orders_with_total = orders_with_total + excluded.orders_with_total;
+    INSERT INTO mv_monthly_trend (month, revenue, orders, orders_with_total)
+        VALUES (COALESCE(strftime('%Y-%m', {r}.order_date), ''), COALESCE({r}.total, 0), 1, {r}.total IS NOT NULL)
+        ON CONFLICT(month) DO UPDATE SET revenue = revenue + excluded.revenue, orders = orders + 1,
+            orders_with_total = orders_with_total + excluded.orders_with_total;
+    INSERT INTO mv_payment_methods (payment_method, revenue, orders, orders_with_total)
+        VALUES (COALESCE({r}.payment_method, ''), COALESCE({r}.total, 0), 1, {r}.total IS NOT NULL)
+        ON CONFLICT(payment_method) DO UPDATE SET revenue = revenue + excluded.revenue, orders = orders + 1,
+            orders_with_total = orders_with_total + excluded.orders_with_total;
+    INSERT INTO mv_revenue_by_product (product_id, revenue, items)
+        SELECT COALESCE(product_id, 0), SUM(line_total), COUNT(*) FROM order_items WHERE order_id = {r}.id
+        GROUP BY COALESCE(product_id, 0)
+        ON CONFLICT(product_id) DO UPDATE SET revenue = revenue + excluded.revenue, items = items + excluded.items;
+"""
+_REMOVE_ORDER = """
+    UPDATE mv_revenue_by_region SET revenue = revenue - COALESCE({r}.total, 0), orders = orders - 1,
+        orders_with_total = orders_with_total - ({r}.total IS NOT NULL)
+        WHERE region = COALESCE({r}.region, '');
+    UPDATE mv_monthly_trend SET revenue = revenue - COALESCE({r}.total, 0), orders = orders - 1,
+        orders_with_total = orders_with_total - ({r}.total IS NOT NULL)
+        WHERE month = COALESCE(strftime('%Y-%m', {r}.order_date), '');
+    UPDATE mv_payment_methods SET revenue = revenue - COALESCE({r}.total, 0), orders = orders - 1,
+        orders_with_total = orders_with_total - ({r}.total IS NOT NULL)
+        WHERE payment_method = COALESCE({r}.payment_method, '');
+    UPDATE mv_revenue_by_product SET
+        revenue = revenue - (SELECT SUM(line_total) FROM order_items
+                             WHERE order_id = {r}.id AND COALESCE(product_id, 0) = mv_revenue_by_product.product_id),
+        items = items - (SELECT COUNT(*) FROM order_items
+                         WHERE order_id = {r}.id AND COALESCE(product_id, 0) = mv_revenue_by_product.product_id)
+        WHERE product_id IN (SELECT COALESCE(product_id, 0) FROM order_items WHERE order_id = {r}.id);
+"""
+_ADD_STATUS = """
+    INSERT INTO mv_order_status (status, orders) VALUES ({r}.status, 1)
+        ON CONFLICT(status) DO UPDATE SET orders = orders + 1;
+"""
+_REMOVE_STATUS = """
+    UPDATE mv_order_status SET orders = orders - 1 WHERE status = {r}.status;
+"""
+_ADD_ITEM = """
+    INSERT INTO mv_revenue_by_product (product_id, revenue, items) VALUES (COALESCE({r}.product_id, 0), {r}.line_total, 1)
+        ON CONFLICT(product_id) DO UPDATE SET revenue = revenue + excluded.revenue, items = items + 1;
+"""
+_REMOVE_ITEM = """
+    UPDATE mv_revenue_by_product SET revenue = revenue - {r}.line_total, items = items - 1
+        WHERE product_id = COALESCE({r}.product_id, 0);
+"""
+_ORDER_COLS = "status, total, region, order_date, payment_method"
+_ITEM_ACTIVE = "(SELECT status FROM orders WHERE id = {r}.order_id) != 'Cancelled'"
+
+SUMMARY_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_orders_insert AFTER INSERT ON orders BEGIN
+        {_ADD_STATUS.format(r="NEW")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_orders_insert_active AFTER INSERT ON orders
+    WHEN NEW.status != 'Cancelled' BEGIN
+        {_ADD_ORDER.format(r="NEW")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_orders_delete AFTER DELETE ON orders BEGIN
+        {_REMOVE_STATUS.format(r="OLD")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_orders_delete_active AFTER DELETE ON orders
+    WHEN OLD.status != 'Cancelled' BEGIN
+        {_REMOVE_ORDER.format(r="OLD")}
+    END""",
+    # Updates back out the old row and apply the new one; the *_active pair
+    # also moves the order's line items in or out of product revenue
+    f"""CREATE TRIGGER IF NOT EXISTS trg_orders_update AFTER UPDATE OF status ON orders BEGIN
+        {_REMOVE_STATUS.format(r="OLD")}
+        {_ADD_STATUS.format(r="NEW")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_orders_update_old AFTER UPDATE OF {_ORDER_COLS} ON orders
+    WHEN OLD.status != 'Cancelled' BEGIN
+        {_REMOVE_ORDER.format(r="OLD")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_orders_update_new AFTER UPDATE OF {_ORDER_COLS} ON orders
+    WHEN NEW.status != 'Cancelled' BEGIN
+        {_ADD_ORDER.format(r="NEW")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_items_insert AFTER INSERT ON order_items
+    WHEN {_ITEM_ACTIVE.format(r="NEW")} BEGIN
+        {_ADD_ITEM.format(r="NEW")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_items_delete AFTER DELETE ON order_items
+    WHEN {_ITEM_ACTIVE.format(r="OLD")} BEGIN
+        {_REMOVE_ITEM.format(r="OLD")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_items_update_old AFTER UPDATE OF order_id, product_id, line_total ON order_items
+    WHEN {_ITEM_ACTIVE.format(r="OLD")} BEGIN
+        {_REMOVE_ITEM.format(r="OLD")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_items_update_new AFTER UPDATE OF order_id, product_id, line_total ON order_items
+    WHEN {_ITEM_ACTIVE.format(r="NEW")} BEGIN
+        {_ADD_ITEM.format(r="NEW")}
+    END""",
+]
+
+# Full rebuild of every summary table from the base tables
+SUMMARY_REFRESH = [
+    "DELETE FROM mv_revenue_by_region",
+    """INSERT INTO mv_revenue_by_region (region, revenue, orders, orders_with_total)
+       SELECT COALESCE(region, ''), COALESCE(SUM(total), 0), COUNT(*), COUNT(total) FROM orders
+       WHERE status != 'Cancelled' GROUP BY COALESCE(region, '')""",
+    "DELETE FROM mv_monthly_trend",
+    """INSERT INTO mv_monthly_trend (month, revenue, orders, orders_with_total)
+       SELECT COALESCE(strftime('%Y-%m', order_date), ''), COALESCE(SUM(total), 0), COUNT(*), COUNT(total) FROM orders
+       WHERE status != 'Cancelled' GROUP BY COALESCE(strftime('%Y-%m', order_date), '')""",
+    "DELETE FROM mv_payment_methods",
+    """INSERT INTO mv_payment_methods (payment_method, revenue, orders, orders_with_total)
+       SELECT COALESCE(payment_method, ''), COALESCE(SUM(total), 0), COUNT(*), COUNT(total) FROM orders
+       WHERE status != 'Cancelled' GROUP BY COALESCE(payment_method, '')""",
+    "DELETE FROM mv_order_status",
+    "INSERT INTO mv_order_status (status, orders) SELECT status, COUNT(*) FROM orders GROUP BY status",
+    "DELETE FROM mv_revenue_by_product",
+    """INSERT INTO mv_revenue_by_product (product_id, revenue, items)
+       SELECT COALESCE(oi.product_id, 0), SUM(oi.line_total), COUNT(*) FROM order_items oi
+       JOIN orders o ON o.id = oi.order_id
+       WHERE o.status != 'Cancelled' GROUP BY COALESCE(oi.product_id, 0)""",
+]
+
+
+def create_summary_tables(conn: sqlite3.Connection):
+    """(Re)create the dashboard summary tables and triggers and rebuild their contents."""
+    c = conn.cursor()
+    # The contents are rebuilt below anyway, so drop and recreate everything;
+    # databases created by an older version pick up schema and trigger changes
+    c.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ('orders', 'order_items')")
+    for (name,) in c.fetchall():
+        c.execute(f"DROP TRIGGER {name}")
+    for mv in SUMMARY_TABLE_NAMES:
+        c.execute(f"DROP TABLE IF EXISTS {mv}")
+    for ddl in SUMMARY_TABLES + SUMMARY_TRIGGERS:
+        c.execute(ddl)
+    for stmt in SUMMARY_REFRESH:
+        c.execute(stmt)
+    conn.commit()
+
+
+def create_indexes(conn: sqlite3.Connection):
+    """Create the covering indexes (if missing) and keep planner statistics current.
+
+    A full ANALYZE only runs when an index was actually created (after seeding
+    or on first start); otherwise PRAGMA optimize re-analyzes just the tables
+    whose statistics it considers stale.
+    """
+    c = conn.cursor()
+    count_indexes = "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'"
+    before = c.execute(count_indexes).fetchone()[0]
+    for ddl in INDEXES:
+        c.execute(ddl)
+    if c.execute(count_indexes).fetchone()[0] != before:
+        c.execute("ANALYZE")
+    else:
+        c.execute("PRAGMA optimize")
+    conn.commit()
+
+
+def seed_data(db_path: str, tune: bool = True, batch_size: int = SEED_BATCH_SIZE):
+    """Seed the database with sample e-commerce data.
+
+    With tune=True (the default) the seeding connections use SEED_PRAGMAS.
+    batch_size caps the rows per multi-row INSERT for customers, orders and
+    order_items.
+    """
     random.seed(42)
-    create_tables(db_path)
-    conn = sqlite3.connect(db_path)
+    # Bound once; the loops below make thousands of these calls
+    choice, choices, randint = random.choice, random.choices, random.randint
+    rand, uniform = random.random, random.uniform
+    create_tables(db_path, tune)
+    # Generate into an in-memory copy of the schema and write the finished
+    # tables to disk at the end. Autocommit mode, so the whole seed is the one
+    # explicit transaction below.
+    conn = sqlite3.connect(":memory:", isolation_level=None)
     c = conn.cursor()
+    c.execute("ATTACH DATABASE ? AS disk", (db_path,))
+    if tune:
+        c.execute("PRAGMA disk.synchronous=OFF")
+    placeholders = ", ".join("?" * len(SEED_TABLES))
+    for (ddl,) in c.execute(f"SELECT sql FROM disk.sqlite_master WHERE type = 'table' AND name IN ({placeholders})",
+                            SEED_TABLES).fetchall():
+        c.execute(ddl)
+    c.execute("BEGIN IMMEDIATE")
 
     # Insert categories
-    for cat in CATEGORIES:
-        c.execute("INSERT INTO categories (id, name, margin) VALUES (?, ?, ?)",
-                  (cat["id"], cat["name"], cat["margin"]))
+    c.execute(SQL_INSERT_CATEGORIES)
 
     # Insert products
-    product_ids = []
-    for i, prod in enumerate(PRODUCTS, 1):
-        rating = round(random.uniform(3.2, 5.0), 1)
-        reviews = random.randint(10, 2500)
-        stock = random.randint(0, 500)
-        created = (datetime(2024, 1, 1) + timedelta(days=random.randint(0, 365))).isoformat()
-        c.execute("""INSERT INTO products (name, category_id, price, cost, stock, rating, reviews_count, created_at)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                  (prod["name"], prod["category_id"], prod["price"], prod["cost"], stock, rating, reviews, created))
-        product_ids.append(i)
+    product_rows = []
+    for name, category_id, price, cost in zip(_NAMES, _CAT_IDS, _PRICES, _COSTS):
+        rating = round(uniform(3.2, 5.0), 1)
+        reviews = randint(10, 2500)
+        stock = randint(0, 500)
+        created = (datetime(2024, 1, 1) + timedelta(days=randint(0, 365))).isoformat()
+        product_rows.append((name, category_id, price, cost, stock, rating, reviews, created))
+    c.executemany(SQL_INSERT_PRODUCT, product_rows)
+    product_ids = list(range(1, len(PRODUCTS) + 1))
 
     # Insert customers
-    customer_ids = []
-    emails_used = set()
-    for i in range(200):
-        fn = random.choice(FIRST_NAMES)
-        ln = random.choice(LAST_NAMES)
-        email_base = f"{fn.lower()}.{ln.lower()}"
-        email = f"{email_base}{random.randint(1,999)}@example.com"
-        while email in emails_used:
-            email = f"{email_base}{random.randint(1,9999)}@example.com"
-        emails_used.add(email)
-        region = random.choice(REGIONS)
-        city = random.choice(CITIES[region])
-        signup = (datetime(2023, 1, 1) + timedelta(days=random.randint(0, 730))).strftime("%Y-%m-%d")
-        c.execute("""INSERT INTO customers (first_name, last_name, email, region, city, signup_date)
-                     VALUES (?, ?, ?, ?, ?, ?)""",
-                  (fn, ln, email, region, city, signup))
-        customer_ids.append(i + 1)
+    customer_rows = []
+    signup_days = _iso_days(date(2023, 1, 1), date(2024, 12, 31))
+    # Numbering each name pair keeps emails unique without a retry loop
+    email_counts = defaultdict(int)
+    for _ in range(200):
+        fn = choice(FIRST_NAMES)
+        ln = choice(LAST_NAMES)
+        email_counts[fn, ln] += 1
+        email = f"{fn.lower()}.{ln.lower()}{email_counts[fn, ln]}@example.com"
+        region = choice(REGIONS)
+        city = choice(CITIES[region])
+        signup = signup_days[randint(0, 730)]
+        customer_rows.append((fn, ln, email, region, city, signup))
+    _multi_values_insert(c, "customers", CUSTOMER_COLUMNS, customer_rows, batch_size)
+    customer_ids = list(range(1, len(customer_rows) + 1))
 
     # Insert orders & order_items
-    start_date = datetime(2024, 1, 1)
-    end_date = datetime(2025, 12, 31)
-    total_days = (end_date - start_date).days
-
-    for order_num in range(500):
-        cust_id = random.choice(customer_ids)
-        order_date = (start_date + timedelta(days=random.randint(0, total_days))).strftime("%Y-%m-%d")
-        status = random.choices(ORDER_STATUSES, weights=[60, 15, 12, 8, 5])[0]
-        payment = random.choice(PAYMENT_METHODS)
-        region = random.choice(REGIONS)
-
-        # Generate 1-5 items per order
-        num_items = random.choices([1, 2, 3, 4, 5], weights=[35, 30, 20, 10, 5])[0]
-        selected_products = random.sample(product_ids, min(num_items, len(product_ids)))
-
-        subtotal = 0
-        items = []
-        for pid in selected_products:
-            prod = PRODUCTS[pid - 1]
-            qty = random.randint(1, 4)
-            unit_price = prod["price"]
+    # Every candidate order date formatted once up front
+    order_days = _iso_days(date(2024, 1, 1), date(2025, 12, 31))
+
+    # Draw each per-order attribute for all orders in one call; choices(k=...)
+    # builds the weight table once instead of once per order
+    n_orders = 500
+    order_customers = choices(customer_ids, k=n_orders)
+    order_dates = choices(order_days, k=n_orders)
+    order_statuses = choices(ORDER_STATUSES, weights=[60, 15, 12, 8, 5], k=n_orders)
+    order_payments = choices(PAYMENT_METHODS, k=n_orders)
+    order_regions = choices(REGIONS, k=n_orders)
+    # 1-5 items per order
+    order_sizes = choices([1, 2, 3, 4, 5], weights=[35, 30, 20, 10, 5], k=n_orders)
+    # No discount on 3 in 7 orders, otherwise 5-20%
+    order_discounts = choices([0, 0.05, 0.10, 0.15, 0.20], weights=[3, 1, 1, 1, 1], k=n_orders)
+
+    # Orders are numbered 1..n_orders here rather than read back via lastrowid,
+    # so both tables go in as batched inserts after the loop
+    order_rows = []
+    order_items = []
+    pool = list(product_ids)
+    n_products = len(pool)
+    for order_id, (cust_id, order_date, status, payment, region, num_items, discount_rate) in enumerate(zip(
+            order_customers, order_dates, order_statuses, order_payments, order_regions, order_sizes,
+            order_discounts), start=1):
+        for i in range(min(num_items, n_products)):
+            # Partial Fisher-Yates over one shared pool: its first num_items
+            # entries become a uniform sample without a per-order list copy
+            j = i + int(rand() * (n_products - i))
+            pid = pool[j]
+            pool[j] = pool[i]
+            pool[i] = pid
+            qty = randint(1, 4)
+            unit_price = _PRICES[pid - 1]
             line_total = round(unit_price * qty, 2)
-            subtotal += line_total
-            items.append((pid, qty, unit_price, line_total))
+            order_items.append((order_id, pid, qty, unit_price, line_total))
 
-        discount = round(subtotal * random.choice([0, 0, 0, 0.05, 0.10, 0.15, 0.20]), 2)
-        tax = round((subtotal - discount) * 0.08, 2)
-        total = round(subtotal - discount + tax, 2)
+        # Amounts are filled in by SQL_ORDER_AMOUNTS once all items are in
+        order_rows.append((order_id, cust_id, order_date, status, payment, discount_rate, region))
 
-        c.execute("""INSERT INTO orders (customer_id, order_date, status, payment_method, subtotal, discount, tax, total, region)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                  (cust_id, order_date, status, payment, subtotal, discount, tax, total, region))
-        order_id = c.lastrowid
+    _multi_values_insert(c, "orders", ORDER_COLUMNS, order_rows, batch_size)
+    _multi_values_insert(c, "order_items", ORDER_ITEM_COLUMNS, order_items, batch_size)
 
-        for pid, qty, up, lt in items:
-            c.execute("""INSERT INTO order_items (order_id, product_id, quantity, unit_price, line_total)
-                         VALUES (?, ?, ?, ?, ?)""",
-                      (order_id, pid, qty, up, lt))
+    # Index the loaded tables in one sorted build each, now that the inserts
+    # are done. The customer index goes in after the order amounts are set
+    # so that update does not have to maintain it.
+    c.execute(INDEX_ORDERITEMS_ORDER)
+    for stmt in SQL_ORDER_AMOUNTS:
+        c.execute(stmt)
+    c.execute(INDEX_ORDERS_CUSTOMER)
 
-    # Update customer lifetime values
+    # Update customer lifetime values from the grouped orders; customers without
+    # orders keep the column defaults of 0. Correlated lookups into agg rather
+    # than UPDATE ... FROM, which needs SQLite 3.33+.
     c.execute("""
+        WITH agg AS (
+            SELECT customer_id,
+                   SUM(CASE WHEN status != 'Cancelled' THEN total ELSE 0 END) AS lifetime_value,
+                   COUNT(*) AS order_count
+            FROM orders
+            GROUP BY customer_id
+        )
         UPDATE customers SET
-            lifetime_value = COALESCE((SELECT SUM(total) FROM orders WHERE orders.customer_id = customers.id AND orders.status != 'Cancelled'), 0),
-            order_count = COALESCE((SELECT COUNT(*) FROM orders WHERE orders.customer_id = customers.id), 0)
+            lifetime_value = (SELECT lifetime_value FROM agg WHERE agg.customer_id = customers.id),
+            order_count = (SELECT order_count FROM agg WHERE agg.customer_id = customers.id)
+        WHERE id IN (SELECT customer_id FROM agg)
     """)
 
     # Insert default dataset record
@@ -289,7 +623,18 @@ def seed_data(db_path: str):
                  VALUES (?, ?, ?, ?, ?, ?)""",
               ("E-Commerce Sample", "seed", 500, 9, datetime.now().isoformat(), "active"))
 
-    conn.commit()
+    # One sequential copy of each finished table into the database file
+    for table in SEED_TABLES:
+        c.execute(f"INSERT INTO disk.{table} SELECT * FROM main.{table}")
+    c.execute("COMMIT")
+    conn.close()
+
+    conn = sqlite3.connect(db_path)
+    if tune:
+        _apply_seed_pragmas(conn.cursor())
+    conn.execute(INDEX_CUSTOMERS_EMAIL)
+    create_indexes(conn)
+    create_summary_tables(conn)
     conn.close()
     return {"message": "Seeded 8 categories, 34 products, 200 customers, 500 orders"}
 